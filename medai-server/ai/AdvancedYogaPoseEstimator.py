@@ -14,7 +14,11 @@ import numpy as np
 import cv2
 import json
 import logging
+import math
 import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Tuple, Any, Optional
 import requests
 from PIL import Image
@@ -22,12 +26,38 @@ from io import BytesIO
 import tensorflow as tf
 import tensorflow_hub as hub
 from scipy.ndimage import gaussian_filter1d
+
+from ai.pose_backends import (
+    InferenceWorker, OnnxMoveNet, TfliteMoveNet, convert_movenet_trt_fp16,
+    create_pose_landmarker, detect_pose_landmarks
+)
+
+# pybase64 is optional - base64 falls back to the stdlib codec without it
+try:
+    import pybase64 as _b64
+except ImportError:
+    _b64 = base64
+
+# libjpeg-turbo is optional - JPEG decoding falls back to PIL without it
+try:
+    from turbojpeg import TurboJPEG, TJPF_RGB
+    _turbo_jpeg = TurboJPEG()
+    # Downscaling factors libjpeg-turbo can apply during decode, smallest first
+    _TURBO_DOWNSCALES = sorted(
+        (sf for sf in _turbo_jpeg.scaling_factors if sf[0] < sf[1]), key=lambda sf: sf[0] / sf[1]
+    )
+except Exception:  # Python package or shared library missing
+    _turbo_jpeg = None
+    _TURBO_DOWNSCALES = []
 os.environ['TF_GRAPPLER_DISABLE'] = '1'
 # Configure logging
 logging.basicConfig(level=logging.INFO, 
                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# TF Hub handle of the MoveNet Thunder SavedModel
+MOVENET_URL = "https://www.kaggle.com/models/google/movenet/TensorFlow2/singlepose-thunder/4"
+
 # MoveNet keypoint names and connections for visualization
 KEYPOINT_NAMES = [
     'nose', 'left_eye', 'right_eye', 'left_ear', 'right_ear',
@@ -36,6 +66,87 @@ KEYPOINT_NAMES = [
     'left_knee', 'right_knee', 'left_ankle', 'right_ankle'
 ]
 
+# MediaPipe Pose landmark index of each KEYPOINT_NAMES entry
+MEDIAPIPE_LANDMARK_IDS = (0, 2, 5, 7, 8, 11, 12, 13, 14, 15, 16, 23, 24, 25, 26, 27, 28)
+
+# Standard mountain pose (Tadasana) returned when detection fails, built once
+DUMMY_KEYPOINTS = [
+    {
+        'part': part,
+        'position': {'x': x, 'y': y},
+        'score': 0.5  # Medium confidence for dummy data
+    }
+    for part, (x, y) in {
+        'nose': (0.5, 0.1),
+        'left_eye': (0.48, 0.09),
+        'right_eye': (0.52, 0.09),
+        'left_ear': (0.46, 0.08),
+        'right_ear': (0.54, 0.08),
+        'left_shoulder': (0.42, 0.22),
+        'right_shoulder': (0.58, 0.22),
+        'left_elbow': (0.42, 0.36),
+        'right_elbow': (0.58, 0.36),
+        'left_wrist': (0.42, 0.48),
+        'right_wrist': (0.58, 0.48),
+        'left_hip': (0.45, 0.55),
+        'right_hip': (0.55, 0.55),
+        'left_knee': (0.45, 0.75),
+        'right_knee': (0.55, 0.75),
+        'left_ankle': (0.45, 0.95),
+        'right_ankle': (0.55, 0.95)
+    }.items()
+]
+
+# KEYPOINT_NAMES position of each part, for indexing (K, 17, 3) keypoint arrays
+KEYPOINT_INDEX = {name: i for i, name in enumerate(KEYPOINT_NAMES)}
+
+# Fixed-point keypoints kept in the smoothing history: x, y scaled by QUANT_SCALE
+# into int16 (1e-4 resolution, range +/-3.2) and score scaled to uint8;
+# one 17-keypoint pose is 85 bytes
+QUANT_SCALE = 10000
+QKP_DTYPE = np.dtype([('xy', np.int16, 2), ('score', np.uint8)])
+
+
+def quantize_keypoints(keypoints: np.ndarray) -> np.ndarray:
+    """Quantize a (17, 3) [x, y, score] float array to a (17,) QKP_DTYPE array."""
+    quantized = np.empty(len(keypoints), dtype=QKP_DTYPE)
+    quantized['xy'] = np.rint(keypoints[:, :2] * QUANT_SCALE)
+    quantized['score'] = np.rint(np.clip(keypoints[:, 2], 0.0, 1.0) * 255)
+    return quantized
+
+
+def dequantize_keypoints(quantized: np.ndarray) -> np.ndarray:
+    """Expand QKP_DTYPE keypoints (any leading shape) back to [..., 3] float32 [x, y, score]."""
+    keypoints = np.empty(quantized.shape + (3,), dtype=np.float32)
+    np.divide(quantized['xy'], QUANT_SCALE, out=keypoints[..., :2])
+    np.divide(quantized['score'], 255, out=keypoints[..., 2])
+    return keypoints
+
+
+# Weighted keypoints for the position-based fallback evaluation
+POSITION_KEYPOINT_WEIGHTS = {
+    'left_shoulder': 1.5,
+    'right_shoulder': 1.5,
+    'left_hip': 1.5,
+    'right_hip': 1.5,
+    'left_knee': 1.2,
+    'right_knee': 1.2,
+    'left_ankle': 1.0,
+    'right_ankle': 1.0,
+    'left_elbow': 1.0,
+    'right_elbow': 1.0,
+    'left_wrist': 0.8,
+    'right_wrist': 0.8,
+    'nose': 0.5
+}
+
+# Position tolerance per trimester for the position-based fallback evaluation
+POSITION_TOLERANCES = {
+    'first': 0.15,   # Stricter in first trimester
+    'second': 0.20,  # Medium tolerance in second trimester
+    'third': 0.25    # More lenient in third trimester
+}
+
 # Define pose connections for skeleton visualization
 POSE_CONNECTIONS = [
     ('nose', 'left_eye'), ('nose', 'right_eye'), ('left_eye', 'left_ear'),
@@ -157,6 +268,9 @@ TRIMESTER_TOLERANCES = {
 class YogaPoseEstimator:
     """Advanced yoga pose estimator using MoveNet and specialized yoga pose analysis."""
     
+    # Largest number of frames sent to MoveNet in one dispatch
+    _MAX_BATCH = 16
+    
     def __init__(self, model_complexity=2, use_movenet_thunder=True, enable_smoothing=True):
         """
         Initialize the YogaPoseEstimator with advanced options.
@@ -168,11 +282,40 @@ class YogaPoseEstimator:
             enable_smoothing: Whether to use temporal smoothing for more stable visualization
         """
         self._reference_poses = {}  # Cache for reference poses
-        self._keypoint_history = [] # For temporal smoothing
+        self._reference_arrays = {}  # (17, 3) keypoint arrays of reference poses, by pose ID
         self._max_history_size = 5  # Number of frames to keep for smoothing
+        # Recent QKP_DTYPE keypoints for temporal smoothing
+        self._keypoint_history = deque(maxlen=self._max_history_size)
         self._enable_smoothing = enable_smoothing
         self._model_loaded = False
         self._last_error_time = 0  # For error rate limiting
+        self._kp_local = threading.local()  # Per-thread [x, y, score] keypoint buffers
+        self._mp_lock = threading.Lock()  # MediaPipe graphs are not safe to run concurrently
+        self._landmarker = None  # MediaPipe Tasks pose landmarker, if configured as the fallback
+        # Contiguous 256x256 MoveNet input slab, only touched by the inference thread
+        self._input_slab = np.zeros((self._MAX_BATCH, 256, 256, 3), dtype=np.uint8)
+        # Decodes and detects the frames of estimate_pose_batch in parallel
+        self._batch_pool = ThreadPoolExecutor(
+            max_workers=min(8, os.cpu_count() or 1),
+            thread_name_prefix="yoga-batch"
+        )
+        
+        # Optional local MoveNet backends used instead of the TF Hub model: an ONNX export
+        # (MOVENET_ONNX_PATH) or a TFLite build such as the INT8 Thunder model for CPU-only
+        # hosts (MOVENET_TFLITE_PATH). Nothing is downloaded, and a configured model must
+        # load, so a bad path fails startup instead of silently switching backends.
+        # On GPU hosts, MOVENET_TRT_FP16=1 swaps in an FP16 TensorRT build of the Hub model
+        self._local_movenet = None
+        self.model = None
+        onnx_path = os.environ.get("MOVENET_ONNX_PATH")
+        tflite_path = os.environ.get("MOVENET_TFLITE_PATH")
+        if onnx_path:
+            self._local_movenet = OnnxMoveNet(onnx_path)
+        elif tflite_path:
+            self._local_movenet = TfliteMoveNet(tflite_path)
+        elif os.environ.get("MOVENET_TRT_FP16") == "1":
+            self.model = convert_movenet_trt_fp16(hub.resolve(MOVENET_URL))
+            self.movenet = self.model.signatures['serving_default']
         
         # Load MoveNet model
         try:
@@ -183,8 +326,13 @@ class YogaPoseEstimator:
                 model_name = "movenet_lightning"
                 
             # Load model
-            self.model = hub.load(f"https://www.kaggle.com/models/google/movenet/TensorFlow2/singlepose-thunder/4")
-            self.movenet = self.model.signatures['serving_default']
+            if self._local_movenet is not None:
+                model_name += " (ONNX)" if onnx_path else " (TFLite)"
+            elif self.model is not None:
+                model_name += " (TF-TRT FP16)"
+            else:
+                self.model = hub.load(MOVENET_URL)
+                self.movenet = self.model.signatures['serving_default']
             
             # Verify model works by running inference on a test image
             test_image = np.zeros((192, 192, 3), dtype=np.uint8)
@@ -193,7 +341,10 @@ class YogaPoseEstimator:
 
 
             print("I RAN TILL HERE")
-            self._run_inference_on_image(image)
+            self._run_movenet_batch([image])
+            
+            # Dedicated MoveNet inference thread; concurrent frames are batched into one dispatch
+            self._infer = InferenceWorker(self._run_movenet_batch, max_batch=self._MAX_BATCH)
 
             # print("LOAD CLASSIFICATION MODEL")
 
@@ -216,19 +367,26 @@ class YogaPoseEstimator:
             logger.error(f"Failed to load MoveNet model: {e}")
             logger.info("Will use fallback mechanisms for pose detection")
             
-            # Initialize MediaPipe as fallback
-            try:
-                import mediapipe as mp
-                self.mp_pose = mp.solutions.pose
-                self.mp_pose_detector = self.mp_pose.Pose(
-                    static_image_mode=True,
-                    model_complexity=model_complexity,
-                    enable_segmentation=False,
-                    min_detection_confidence=0.5
-                )
-                logger.info("Initialized MediaPipe Pose as fallback")
-            except Exception as mp_error:
-                logger.error(f"Failed to initialize MediaPipe fallback: {mp_error}")
+            # With a .task bundle configured, fall back to the Tasks API landmarker on its
+            # delegate (GPU by default, or XNNPACK on CPU) instead of the legacy Pose graph.
+            # Frames are independent requests, so it runs in IMAGE mode; it must load once configured
+            task_path = os.environ.get("MEDIAPIPE_POSE_TASK_PATH")
+            if task_path:
+                self._landmarker = create_pose_landmarker(task_path)
+            else:
+                # Initialize MediaPipe as fallback
+                try:
+                    import mediapipe as mp
+                    self.mp_pose = mp.solutions.pose
+                    self.mp_pose_detector = self.mp_pose.Pose(
+                        static_image_mode=True,
+                        model_complexity=model_complexity,
+                        enable_segmentation=False,
+                        min_detection_confidence=0.5
+                    )
+                    logger.info("Initialized MediaPipe Pose as fallback")
+                except Exception as mp_error:
+                    logger.error(f"Failed to initialize MediaPipe fallback: {mp_error}")
         
         # Load predefined reference poses
         self._load_reference_poses()
@@ -279,18 +437,43 @@ class YogaPoseEstimator:
         Returns:
             Array of keypoints [y, x, confidence] for each of the 17 keypoints
         """
-        # Convert to tensor, add batch dimension, and ensure int32 dtype
-
-        image_test = tf.cast(tf.image.resize_with_pad(image, 256, 256), dtype=tf.int32)
-        input_image = tf.cast(tf.expand_dims(image_test, axis=0), dtype=tf.int32)
+        # Hand the frame to the inference thread and wait for its keypoints
+        return self._infer.run(image)
+    
+    def _run_movenet_batch(self, images: List[np.ndarray]) -> np.ndarray:
+        """
+        Run MoveNet on one or more frames in a single dispatch.
+        Only called from the inference thread (or before it starts), which owns the input slab.
         
-        # Run inference
-        outputs = self.movenet(input_image)
+        Args:
+            images: Up to _MAX_BATCH images as numpy arrays (RGB format)
+            
+        Returns:
+            (N, 17, 3) array of [y, x, confidence] keypoints
+        """
+        input_batch = self._input_slab[:len(images)]
+        for idx, image in enumerate(images):
+            # preprocess_image already letterboxes to 256x256 - only resize other inputs
+            if tuple(image.shape[:2]) != (256, 256):
+                image = tf.image.resize_with_pad(image, 256, 256)
+            input_batch[idx] = image
+        
+        if self._local_movenet is not None:
+            return self._local_movenet(input_batch)
+        
+        # MoveNet expects int32 input - convert the uint8 slab in one cast
+        input_tensor = tf.cast(tf.convert_to_tensor(input_batch), dtype=tf.int32)
         
-        # Extract keypoints from output
-        keypoints = outputs['output_0'].numpy().squeeze()
+        if len(images) == 1:
+            return self.movenet(input_tensor)['output_0'].numpy()[:, 0]
         
-        return keypoints
+        # The singlepose signature is fixed at batch size 1, so map it over
+        # the batch inside one graph call instead of N Python round-trips
+        return tf.map_fn(
+            lambda frame: self.movenet(tf.expand_dims(frame, axis=0))['output_0'][0, 0],
+            input_tensor,
+            fn_output_signature=tf.float32
+        ).numpy()
     
     def preprocess_image(self, image_data: bytes) -> np.ndarray:
         """
@@ -303,17 +486,24 @@ class YogaPoseEstimator:
             Preprocessed image as numpy array
         """
         try:
-            # Convert bytes to PIL Image
-            image = Image.open(BytesIO(image_data))
-            
-            # Convert to RGB (in case of RGBA or other formats)
-            image = image.convert('RGB')
+            input_size = 256
             
-            # Convert to numpy array
-            image_np = np.array(image)
+            image_np = self._decode_jpeg_turbo(image_data, input_size)
+            if image_np is None:
+                # Convert bytes to PIL Image
+                image = Image.open(BytesIO(image_data))
+                
+                # For JPEGs, have libjpeg emit RGB directly, DCT-downscaled to no less than the input size
+                image.draft('RGB', (input_size, input_size))
+                
+                # Convert to RGB (in case of RGBA or other formats)
+                if image.mode != 'RGB':
+                    image = image.convert('RGB')
+                
+                # Convert to numpy array
+                image_np = np.asarray(image)
             
             # Resize to appropriate input size for model (maintain aspect ratio)
-            input_size = 256
             height, width = image_np.shape[:2]
             
             # Calculate resize dimensions
@@ -324,14 +514,14 @@ class YogaPoseEstimator:
                 new_width = input_size
                 new_height = int(height * (input_size / width))
             
-            # Resize image
-            image_np = cv2.resize(image_np, (new_width, new_height))
-            
-            # Create square image with padding
+            # Create square image with padding and resize straight into its centered region
             square_image = np.zeros((input_size, input_size, 3), dtype=np.uint8)
             offset_x = (input_size - new_width) // 2
             offset_y = (input_size - new_height) // 2
-            square_image[offset_y:offset_y+new_height, offset_x:offset_x+new_width] = image_np
+            region = square_image[offset_y:offset_y+new_height, offset_x:offset_x+new_width]
+            resized_image = cv2.resize(image_np, (new_width, new_height), dst=region)
+            if resized_image is not region:  # OpenCV could not write into the view
+                region[...] = resized_image
             
             return square_image
             
@@ -345,6 +535,32 @@ class YogaPoseEstimator:
             # Return a black image of valid size
             return np.zeros((256, 256, 3), dtype=np.uint8)
     
+    def _decode_jpeg_turbo(self, image_data: bytes, min_side: int) -> Optional[np.ndarray]:
+        """
+        Decode a JPEG to RGB with libjpeg-turbo's SIMD decoder.
+        
+        Args:
+            image_data: Encoded image data
+            min_side: Smallest longest side to keep when downscaling during decode
+            
+        Returns:
+            RGB image as numpy array, or None if libjpeg-turbo is unavailable or
+            the data isn't a JPEG it can decode
+        """
+        if _turbo_jpeg is None or image_data[:2] != b'\xff\xd8':
+            return None
+        try:
+            # Let the IDCT shrink large frames (1/2, 1/4, 1/8) instead of resizing later
+            width, height, _, _ = _turbo_jpeg.decode_header(image_data)
+            scaling_factor = (1, 1)
+            for num, denom in _TURBO_DOWNSCALES:
+                if max(width, height) * num >= min_side * denom:
+                    scaling_factor = (num, denom)
+                    break
+            return _turbo_jpeg.decode(image_data, pixel_format=TJPF_RGB, scaling_factor=scaling_factor)
+        except OSError:  # Corrupt or unsupported JPEG - let PIL try
+            return None
+    
     def detect_pose(self, image: np.ndarray) -> List[Dict[str, Any]]:
         """
         Detect pose keypoints in an image.
@@ -355,37 +571,39 @@ class YogaPoseEstimator:
         Returns:
             List of keypoint dictionaries
         """
+        buf = self._keypoint_buffer()
+        if not self._detect_into(image, buf):
+            # If all else fails, return dummy keypoints
+            return self._get_dummy_keypoints()
+        
+        # Apply temporal smoothing if enabled
+        if self._enable_smoothing:
+            buf = self._apply_temporal_smoothing(buf)
+        
+        return self._buffer_to_keypoints(buf)
+    
+    def _detect_into(self, image: np.ndarray, out: np.ndarray) -> bool:
+        """
+        Detect pose keypoints in an image, writing them to a (17, 3) [x, y, score] array.
+        
+        Args:
+            image: Preprocessed image as numpy array
+            out: Array receiving the keypoints
+            
+        Returns:
+            True if a pose was detected, False if out was left untouched
+        """
         # If model is loaded, use MoveNet
         if self._model_loaded:
             try:
                 # Run inference
                 keypoints = self._run_inference_on_image(image)
                 
-                # Format keypoints to match expected output format
-                formatted_keypoints = []
-                
-                for idx, name in enumerate(KEYPOINT_NAMES):
-                    # MoveNet returns [y, x, confidence]
-                    y, x, confidence = keypoints[idx]
-                    
-                    # Convert to normalized coordinates [0, 1]
-                    normalized_x = min(max(x, 0.0), 1.0)
-                    normalized_y = min(max(y, 0.0), 1.0)
-                    
-                    formatted_keypoints.append({
-                        'part': name,
-                        'position': {
-                            'x': float(normalized_x),
-                            'y': float(normalized_y)
-                        },
-                        'score': float(confidence)
-                    })
-                
-                # Apply temporal smoothing if enabled
-                if self._enable_smoothing and formatted_keypoints:
-                    formatted_keypoints = self._apply_temporal_smoothing(formatted_keypoints)
-                
-                return formatted_keypoints
+                # MoveNet returns [y, x, confidence] rows; write them as [x, y, score]
+                # with coordinates clamped to [0, 1]
+                np.clip(keypoints[:, 1::-1], 0.0, 1.0, out=out[:, :2])
+                out[:, 2] = keypoints[:, 2]
+                return True
                 
             except Exception as e:
                 # If MoveNet fails, log error and fall back to MediaPipe or dummy data
@@ -395,55 +613,27 @@ class YogaPoseEstimator:
                     self._last_error_time = current_time
         
         # Fallback to MediaPipe if available
-        if hasattr(self, 'mp_pose_detector'):
+        if self._landmarker is not None or hasattr(self, 'mp_pose_detector'):
             try:
-                # Convert to RGB for MediaPipe (it expects RGB)
-                image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB) if len(image.shape) == 3 else image
+                # preprocess_image already yields RGB, which MediaPipe expects; only make sure
+                # the frame is C-contiguous so MediaPipe can wrap it without copying
+                image_rgb = np.ascontiguousarray(image, dtype=np.uint8)
                 
                 # Process with MediaPipe
-                results = self.mp_pose_detector.process(image_rgb)
+                with self._mp_lock:
+                    if self._landmarker is not None:
+                        landmarks = detect_pose_landmarks(self._landmarker, image_rgb)
+                    else:
+                        results = self.mp_pose_detector.process(image_rgb)
+                        landmarks = results.pose_landmarks.landmark if results.pose_landmarks else None
                 
-                if results.pose_landmarks:
+                if landmarks is not None:
                     # Map MediaPipe landmarks to our format
-                    formatted_keypoints = []
-                    
-                    # MediaPipe pose landmarks mapping
-                    mp_to_our_format = {
-                        0: 'nose',
-                        2: 'left_eye',
-                        5: 'right_eye',
-                        7: 'left_ear',
-                        8: 'right_ear',
-                        11: 'left_shoulder',
-                        12: 'right_shoulder',
-                        13: 'left_elbow',
-                        14: 'right_elbow',
-                        15: 'left_wrist',
-                        16: 'right_wrist',
-                        23: 'left_hip',
-                        24: 'right_hip',
-                        25: 'left_knee',
-                        26: 'right_knee',
-                        27: 'left_ankle',
-                        28: 'right_ankle'
-                    }
-                    
-                    for mp_idx, our_part in mp_to_our_format.items():
-                        landmark = results.pose_landmarks.landmark[mp_idx]
-                        formatted_keypoints.append({
-                            'part': our_part,
-                            'position': {
-                                'x': landmark.x,  # MediaPipe already normalizes to 0-1
-                                'y': landmark.y   # MediaPipe already normalizes to 0-1
-                            },
-                            'score': landmark.visibility  # MediaPipe provides visibility as confidence
-                        })
-                    
-                    # Apply temporal smoothing if enabled
-                    if self._enable_smoothing and formatted_keypoints:
-                        formatted_keypoints = self._apply_temporal_smoothing(formatted_keypoints)
-                    
-                    return formatted_keypoints
+                    for idx, mp_idx in enumerate(MEDIAPIPE_LANDMARK_IDS):
+                        landmark = landmarks[mp_idx]
+                        # MediaPipe already normalizes to 0-1 and provides visibility as confidence
+                        out[idx] = (landmark.x, landmark.y, landmark.visibility)
+                    return True
                     
             except Exception as mp_e:
                 # If MediaPipe fails, log error and fall back to dummy data
@@ -452,109 +642,60 @@ class YogaPoseEstimator:
                     logger.error(f"Error in MediaPipe detection: {str(mp_e)}")
                     self._last_error_time = current_time
         
-        # If all else fails, return dummy keypoints
-        return self._get_dummy_keypoints()
+        return False
+    
+    def _keypoint_buffer(self) -> np.ndarray:
+        """Get this thread's reusable (17, 3) [x, y, score] keypoint buffer."""
+        buf = getattr(self._kp_local, 'buf', None)
+        if buf is None:
+            buf = self._kp_local.buf = np.empty((len(KEYPOINT_NAMES), 3), dtype=np.float32)
+        return buf
+    
+    def _buffer_to_keypoints(self, buf: np.ndarray) -> List[Dict[str, Any]]:
+        """Build keypoint dictionaries from a (17, 3) [x, y, score] buffer."""
+        return [
+            {
+                'part': name,
+                'position': {
+                    'x': x,
+                    'y': y
+                },
+                'score': score
+            }
+            for name, (x, y, score) in zip(KEYPOINT_NAMES, buf.tolist())
+        ]
     
-    def _apply_temporal_smoothing(self, current_keypoints: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    def _apply_temporal_smoothing(self, current_keypoints: np.ndarray) -> np.ndarray:
         """
         Apply temporal smoothing to keypoints for more stable visualization.
         
         Args:
-            current_keypoints: Current frame's keypoints
+            current_keypoints: Current frame's (17, 3) [x, y, score] keypoints
             
         Returns:
-            Smoothed keypoints
+            Smoothed (17, 3) keypoints
         """
-        # Add current keypoints to history
-        self._keypoint_history.append(current_keypoints)
-        
-        # Keep history within size limit
-        if len(self._keypoint_history) > self._max_history_size:
-            self._keypoint_history.pop(0)
+        # Add current keypoints to history (the deque drops the oldest frame)
+        self._keypoint_history.append(quantize_keypoints(current_keypoints))
         
         # If we don't have enough history yet, return current keypoints
         if len(self._keypoint_history) < 3:
             return current_keypoints
         
-        # Create a map of keypoint parts for the current frame
-        current_keypoint_map = {kp['part']: kp for kp in current_keypoints}
-        
-        # Prepare arrays for smoothing X and Y positions
-        smoothed_keypoints = []
-        
-        # For each keypoint part
-        for part in KEYPOINT_NAMES:
-            # Extract position history for this part
-            x_history = []
-            y_history = []
-            score_history = []
-            
-            for frame in self._keypoint_history:
-                # Find this part in the frame
-                keypoint = next((kp for kp in frame if kp['part'] == part), None)
-                if keypoint:
-                    x_history.append(keypoint['position']['x'])
-                    y_history.append(keypoint['position']['y'])
-                    score_history.append(keypoint['score'])
-            
-            # If we have history for this part
-            if x_history and y_history:
-                # Apply Gaussian smoothing
-                x_smooth = gaussian_filter1d(np.array(x_history), sigma=1.0)[-1]
-                y_smooth = gaussian_filter1d(np.array(y_history), sigma=1.0)[-1]
-                
-                # Use average of most recent scores
-                recent_scores = score_history[-3:] if len(score_history) >= 3 else score_history
-                avg_score = sum(recent_scores) / len(recent_scores)
-                
-                # Create smoothed keypoint
-                smoothed_keypoints.append({
-                    'part': part,
-                    'position': {
-                        'x': float(x_smooth),
-                        'y': float(y_smooth)
-                    },
-                    'score': float(avg_score)
-                })
-            elif part in current_keypoint_map:
-                # If no history but exists in current frame, use current value
-                smoothed_keypoints.append(current_keypoint_map[part])
-        
-        return smoothed_keypoints
-    
-    def _get_dummy_keypoints(self) -> List[Dict[str, Any]]:
-        """Generate dummy keypoints when detection fails."""
-        # Standard pose in mountain pose (Tadasana)
-        keypoint_positions = {
-            'nose': (0.5, 0.1),
-            'left_eye': (0.48, 0.09),
-            'right_eye': (0.52, 0.09),
-            'left_ear': (0.46, 0.08),
-            'right_ear': (0.54, 0.08),
-            'left_shoulder': (0.42, 0.22),
-            'right_shoulder': (0.58, 0.22),
-            'left_elbow': (0.42, 0.36),
-            'right_elbow': (0.58, 0.36),
-            'left_wrist': (0.42, 0.48),
-            'right_wrist': (0.58, 0.48),
-            'left_hip': (0.45, 0.55),
-            'right_hip': (0.55, 0.55),
-            'left_knee': (0.45, 0.75),
-            'right_knee': (0.55, 0.75),
-            'left_ankle': (0.45, 0.95),
-            'right_ankle': (0.55, 0.95)
-        }
+        history = dequantize_keypoints(np.stack(list(self._keypoint_history)))
+        smoothed = np.empty_like(current_keypoints)
+        
+        # Apply Gaussian smoothing over time to every x and y at once
+        smoothed[:, :2] = gaussian_filter1d(history[:, :, :2], sigma=1.0, axis=0)[-1]
         
-        # Create formatted keypoints
-        formatted_keypoints = []
-        for part, (x, y) in keypoint_positions.items():
-            formatted_keypoints.append({
-                'part': part,
-                'position': {'x': x, 'y': y},
-                'score': 0.5  # Medium confidence for dummy data
-            })
+        # Use average of most recent scores
+        smoothed[:, 2] = history[-3:, :, 2].mean(axis=0)
         
-        return formatted_keypoints
+        return smoothed
+    
+    def _get_dummy_keypoints(self) -> List[Dict[str, Any]]:
+        """Get dummy keypoints when detection fails (shared list, do not modify)."""
+        return DUMMY_KEYPOINTS
     
     def get_reference_pose(self, pose_id: str) -> Dict[str, Any]:
         """
@@ -915,78 +1056,129 @@ class YogaPoseEstimator:
         Evaluate yoga pose accuracy using advanced angle-based comparison.
         
         Args:
-            detected_keypoints: Keypoints from the detected pose
-            reference_keypoints: Keypoints from the reference pose
+            detected_keypoints: Keypoints from the detected pose, as a list or (17, 3) array
+            reference_keypoints: Keypoints from the reference pose, as a list or (17, 3) array
             pose_id: Identifier of the yoga pose
             trimester: Pregnancy trimester ('first', 'second', or 'third')
             
         Returns:
             Accuracy percentage (0-100)
         """
-        if not detected_keypoints or not reference_keypoints:
+        if not len(detected_keypoints) or not len(reference_keypoints):
             logger.warning("Missing keypoints for pose evaluation")
             return 0.0
         
         try:
-            # Get angle definitions for this pose
-            pose_angles = POSE_ANGLE_DEFINITIONS.get(pose_id)
-            if not pose_angles:
-                logger.warning(f"No angle definitions found for pose {pose_id}, using position-based evaluation")
-                return self._evaluate_pose_by_position(detected_keypoints, reference_keypoints, trimester)
-            
-            # Convert keypoints to dictionaries for quick lookup
-            detected_dict = {kp['part']: kp for kp in detected_keypoints}
-            reference_dict = {kp['part']: kp for kp in reference_keypoints}
+            # Complete poses are scored with the vectorized kernel
+            detected = self._keypoints_to_array(detected_keypoints)
+            reference = self._keypoints_to_array(reference_keypoints)
+            if detected is not None and reference is not None:
+                return float(self.evaluate_pose_batch(detected[None], reference, pose_id, trimester)[0])
+            if isinstance(reference_keypoints, np.ndarray):
+                reference_keypoints = self._buffer_to_keypoints(reference_keypoints)
+            return self._evaluate_pose_by_angles(detected_keypoints, reference_keypoints, pose_id, trimester)
+                
+        except Exception as e:
+            logger.error(f"Error in pose evaluation: {str(e)}")
+            return 50.0  # Return medium accuracy on error
+    
+    def _evaluate_pose_by_angles(self, detected_keypoints: List[Dict[str, Any]],
+                                 reference_keypoints: List[Dict[str, Any]],
+                                 pose_id: str = '1-1',
+                                 trimester: str = 'second') -> float:
+        """
+        Angle-based evaluation of keypoint lists, falling back to positions when the
+        pose has no angle definitions or too few of its angles can be measured.
+        
+        Args:
+            detected_keypoints: Keypoints from the detected pose
+            reference_keypoints: Keypoints from the reference pose
+            pose_id: Identifier of the yoga pose
+            trimester: Pregnancy trimester ('first', 'second', or 'third')
             
-            total_score = 0.0
-            total_weight = 0.0
+        Returns:
+            Accuracy percentage (0-100)
+        """
+        # Get angle definitions for this pose
+        pose_angles = POSE_ANGLE_DEFINITIONS.get(pose_id)
+        if not pose_angles:
+            logger.warning(f"No angle definitions found for pose {pose_id}, using position-based evaluation")
+            return self._evaluate_pose_by_position(detected_keypoints, reference_keypoints, trimester)
+        
+        # Convert keypoints to dictionaries for quick lookup
+        detected_dict = {kp['part']: kp for kp in detected_keypoints}
+        reference_dict = {kp['part']: kp for kp in reference_keypoints}
+        
+        total_score = 0.0
+        total_weight = 0.0
+        
+        # Get trimester-specific tolerance
+        tolerance = TRIMESTER_TOLERANCES.get(trimester, TRIMESTER_TOLERANCES['second'])
+        
+        # Compare key angles
+        for i, (a, b, c) in enumerate(pose_angles['angles']):
+            # Skip if any keypoint is missing
+            if (a not in detected_dict or b not in detected_dict or c not in detected_dict or
+                a not in reference_dict or b not in reference_dict or c not in reference_dict):
+                continue
             
-            # Get trimester-specific tolerance
-            tolerance = TRIMESTER_TOLERANCES.get(trimester, TRIMESTER_TOLERANCES['second'])
+            # Get expected angle value and weight
+            expected_angle = pose_angles['expected_values'][i]
+            weight = pose_angles['weights'][i] if i < len(pose_angles['weights']) else 1.0
             
-            # Compare key angles
-            for i, (a, b, c) in enumerate(pose_angles['angles']):
-                # Skip if any keypoint is missing
-                if (a not in detected_dict or b not in detected_dict or c not in detected_dict or
-                    a not in reference_dict or b not in reference_dict or c not in reference_dict):
-                    continue
-                
-                # Get expected angle value and weight
-                expected_angle = pose_angles['expected_values'][i]
-                weight = pose_angles['weights'][i] if i < len(pose_angles['weights']) else 1.0
-                
-                # Calculate actual angle in detected pose
-                detected_angle = self._calculate_angle(
-                    detected_dict[a]['position'],
-                    detected_dict[b]['position'],
-                    detected_dict[c]['position']
-                )
-                
-                # Calculate difference from expected angle
-                angle_diff = abs(detected_angle - expected_angle)
-                
-                # Convert to similarity score (0-1)
-                # Adjust for trimester-specific tolerance
-                angle_similarity = max(0, 1.0 - angle_diff / tolerance)
-                
-                # Add to total with weight
-                total_score += angle_similarity * weight
-                total_weight += weight
+            # Calculate actual angle in detected pose
+            detected_angle = self._calculate_angle(
+                detected_dict[a]['position'],
+                detected_dict[b]['position'],
+                detected_dict[c]['position']
+            )
             
-            # Check if we have enough data for angle-based evaluation
-            if total_weight < 2.0:
-                # Fall back to position-based evaluation
-                return self._evaluate_pose_by_position(detected_keypoints, reference_keypoints, trimester)
+            # Calculate difference from expected angle
+            angle_diff = abs(detected_angle - expected_angle)
             
-            # Calculate final normalized score (0-100)
-            accuracy = (total_score / total_weight) * 100
+            # Convert to similarity score (0-1)
+            # Adjust for trimester-specific tolerance
+            angle_similarity = max(0, 1.0 - angle_diff / tolerance)
             
-            # Ensure result is within valid range
-            return max(0, min(100, accuracy))
-                
-        except Exception as e:
-            logger.error(f"Error in pose evaluation: {str(e)}")
-            return 50.0  # Return medium accuracy on error
+            # Add to total with weight
+            total_score += angle_similarity * weight
+            total_weight += weight
+        
+        # Check if we have enough data for angle-based evaluation
+        if total_weight < 2.0:
+            # Fall back to position-based evaluation
+            return self._evaluate_pose_by_position(detected_keypoints, reference_keypoints, trimester)
+        
+        # Calculate final normalized score (0-100)
+        accuracy = (total_score / total_weight) * 100
+        
+        # Ensure result is within valid range
+        return max(0, min(100, accuracy))
+    
+    def _keypoints_to_array(self, keypoints) -> Optional[np.ndarray]:
+        """
+        Convert keypoints to a (17, 3) [x, y, score] array in KEYPOINT_NAMES order.
+        
+        Arrays are returned unchanged; None if a keypoint list is missing any part.
+        """
+        if isinstance(keypoints, np.ndarray):
+            return keypoints
+        by_part = {kp['part']: kp for kp in keypoints}
+        if not by_part.keys() >= KEYPOINT_INDEX.keys():
+            return None
+        return np.array(
+            [(by_part[name]['position']['x'], by_part[name]['position']['y'], by_part[name].get('score', 1.0))
+             for name in KEYPOINT_NAMES],
+            dtype=np.float32
+        )
+    
+    def _get_reference_array(self, pose_id: str) -> np.ndarray:
+        """Get the cached (17, 3) keypoint array of a reference pose."""
+        reference = self._reference_arrays.get(pose_id)
+        if reference is None:
+            reference = self._keypoints_to_array(self.get_reference_pose(pose_id)['keypoints'])
+            self._reference_arrays[pose_id] = reference
+        return reference
     
     def _evaluate_pose_by_position(self, detected_keypoints: List[Dict[str, Any]], 
                                   reference_keypoints: List[Dict[str, Any]],
@@ -1006,43 +1198,21 @@ class YogaPoseEstimator:
         detected_dict = {kp['part']: kp for kp in detected_keypoints}
         reference_dict = {kp['part']: kp for kp in reference_keypoints}
         
-        # Define important keypoints with weights
-        keypoint_weights = {
-            'left_shoulder': 1.5,
-            'right_shoulder': 1.5,
-            'left_hip': 1.5,
-            'right_hip': 1.5,
-            'left_knee': 1.2,
-            'right_knee': 1.2,
-            'left_ankle': 1.0,
-            'right_ankle': 1.0,
-            'left_elbow': 1.0,
-            'right_elbow': 1.0,
-            'left_wrist': 0.8,
-            'right_wrist': 0.8,
-            'nose': 0.5
-        }
-        
         total_score = 0.0
         total_weight = 0.0
         
         # Get trimester-specific tolerance
         # This value affects how strict we are with position matching
-        position_tolerance = {
-            'first': 0.15,   # Stricter in first trimester
-            'second': 0.20,  # Medium tolerance in second trimester
-            'third': 0.25    # More lenient in third trimester
-        }.get(trimester, 0.20)
+        position_tolerance = POSITION_TOLERANCES.get(trimester, 0.20)
         
         # Compare each keypoint position
-        for part, weight in keypoint_weights.items():
+        for part, weight in POSITION_KEYPOINT_WEIGHTS.items():
             if part in detected_dict and part in reference_dict:
                 det_pos = detected_dict[part]['position']
                 ref_pos = reference_dict[part]['position']
                 
                 # Calculate Euclidean distance
-                distance = ((det_pos['x'] - ref_pos['x']) ** 2 + 
-                           (det_pos['y'] - ref_pos['y']) ** 2) ** 0.5
+                distance = math.hypot(det_pos['x'] - ref_pos['x'], det_pos['y'] - ref_pos['y'])
                 
                 # Convert to similarity score (0-1)
                 # Higher tolerance (higher divisor) means we're more lenient
@@ -1059,6 +1229,57 @@ class YogaPoseEstimator:
         else:
             return 0.0
     
+    def evaluate_pose_batch(self, keypoints: np.ndarray,
+                            reference: np.ndarray,
+                            pose_id: str = '1-1',
+                            trimester: str = 'second') -> np.ndarray:
+        """
+        Evaluate many detected poses at once; vectorized form of evaluate_pose.
+        
+        Args:
+            keypoints: (K, 17, 3) array of [x, y, score] keypoints in KEYPOINT_NAMES order
+            reference: (17, 3) keypoint array of the reference pose
+            pose_id: Identifier of the yoga pose
+            trimester: Pregnancy trimester ('first', 'second', or 'third')
+            
+        Returns:
+            (K,) array of accuracy percentages (0-100)
+        """
+        xs = keypoints[..., 0]
+        ys = keypoints[..., 1]
+        
+        pose_angles = POSE_ANGLE_DEFINITIONS.get(pose_id)
+        if pose_angles:
+            angle_parts = pose_angles['angles']
+            weights = np.array([
+                pose_angles['weights'][i] if i < len(pose_angles['weights']) else 1.0
+                for i in range(len(angle_parts))
+            ])
+        
+        if not pose_angles or weights.sum() < 2.0:
+            # Position-based evaluation against the reference keypoints
+            idx = [KEYPOINT_INDEX[part] for part in POSITION_KEYPOINT_WEIGHTS]
+            weights = np.array(list(POSITION_KEYPOINT_WEIGHTS.values()))
+            distances = np.hypot(xs[:, idx] - reference[idx, 0], ys[:, idx] - reference[idx, 1])
+            tolerance = POSITION_TOLERANCES.get(trimester, 0.20)
+            similarity = np.fmax(0.0, 1.0 - distances / tolerance)
+        else:
+            # Angle at b of every (a, b, c) triple, for all frames at once
+            a, b, c = (np.array([KEYPOINT_INDEX[triple[j]] for triple in angle_parts]) for j in range(3))
+            ba_x, ba_y = xs[:, a] - xs[:, b], ys[:, a] - ys[:, b]
+            bc_x, bc_y = xs[:, c] - xs[:, b], ys[:, c] - ys[:, b]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                cosine = (ba_x * bc_x + ba_y * bc_y) / (np.hypot(ba_x, ba_y) * np.hypot(bc_x, bc_y))
+            angles = np.degrees(np.arccos(np.clip(cosine, -1.0, 1.0)))
+            
+            tolerance = TRIMESTER_TOLERANCES.get(trimester, TRIMESTER_TOLERANCES['second'])
+            expected = np.array(pose_angles['expected_values'][:len(angle_parts)])
+            # fmax maps the NaN angle of a degenerate (zero-length) limb to 0, like max() does
+            similarity = np.fmax(0.0, 1.0 - np.abs(angles - expected) / tolerance)
+        
+        accuracy = similarity @ weights / weights.sum() * 100
+        return np.clip(accuracy, 0, 100)
+    
     def estimate_pose(self, image_data: bytes, pose_id: str, trimester: str = None) -> Dict[str, Any]:
         """
         Process image to detect pose, evaluate accuracy, and return results.
@@ -1079,7 +1300,7 @@ class YogaPoseEstimator:
                 # Handle data URI format
                 if ',' in image_data:
                     image_data = image_data.split(',')[1]
-                image_bytes = base64.b64decode(image_data)
+                image_bytes = _b64.b64decode(image_data)
             else:
                 image_bytes = image_data
             
@@ -1103,7 +1324,7 @@ class YogaPoseEstimator:
             evaluation_start = time.time()
             accuracy = self.evaluate_pose(
                 detected_keypoints, 
-                reference_keypoints, 
+                self._get_reference_array(pose_id), 
                 pose_id, 
                 trimester
             )
@@ -1142,6 +1363,65 @@ class YogaPoseEstimator:
                 'error': str(e)
             }
     
+    def estimate_pose_batch(self, frames: List[Any], pose_id: str, trimester: str = None) -> Dict[str, Any]:
+        """
+        Detect and score a batch of frames against one reference pose.
+        
+        Frames are decoded and run through the pose model in parallel, then
+        scored together by evaluate_pose_batch. Temporal smoothing is not
+        applied, so the batch doesn't disturb the live stream's history.
+        
+        Args:
+            frames: Images as bytes or base64 strings
+            pose_id: Identifier of the expected yoga pose
+            trimester: Optional pregnancy trimester ('first', 'second', 'third')
+            
+        Returns:
+            Dictionary with per-frame detected flags, accuracies and keypoints;
+            frames that could not be decoded or had no pose have None accuracy
+            and keypoints
+        """
+        start_time = time.time()
+        
+        reference_keypoints = self.get_reference_pose(pose_id)['keypoints']
+        if not trimester:
+            trimester = self._get_pose_info(pose_id).get('trimester', 'second')
+        
+        keypoints = np.empty((len(frames), len(KEYPOINT_NAMES), 3), dtype=np.float32)
+        detected = np.fromiter(self._batch_pool.map(self._detect_frame, frames, keypoints),
+                               dtype=bool, count=len(frames))
+        
+        # Only score frames with a real detection
+        accuracies = [None] * len(frames)
+        if detected.any():
+            scores = self.evaluate_pose_batch(keypoints[detected], self._get_reference_array(pose_id), pose_id, trimester)
+            for idx, score in zip(np.flatnonzero(detected).tolist(), scores.tolist()):
+                accuracies[idx] = score
+        
+        return {
+            'pose_id': pose_id,
+            'detected': detected.tolist(),
+            'accuracies': accuracies,
+            'keypoints': [self._buffer_to_keypoints(frame) if found else None
+                          for frame, found in zip(keypoints, detected.tolist())],
+            'reference_keypoints': reference_keypoints,
+            'processing_time': time.time() - start_time
+        }
+    
+    def _detect_frame(self, image_data: Any, out: np.ndarray) -> bool:
+        """Decode one batch frame and write its keypoints to out; False if none were detected."""
+        try:
+            if isinstance(image_data, str):
+                # Handle data URI format
+                if ',' in image_data:
+                    image_data = image_data.split(',')[1]
+                image_data = _b64.b64decode(image_data)
+            
+            return self._detect_into(self.preprocess_image(image_data), out)
+        except Exception as e:
+            logger.error(f"Error detecting pose in batch frame: {str(e)}")
+            return False
+    
     def analyze_pose_issues(self, 
                           detected_keypoints: List[Dict[str, Any]], 
                           reference_keypoints: List[Dict[str, Any]], 
@@ -1391,5 +1671,22 @@ class YogaPoseEstimator:
         
         return results
 
-# Create a singleton instance
-advanced_yoga_pose_estimator = YogaPoseEstimator(use_movenet_thunder=True, enable_smoothing=True)
\ No newline at end of file
+# Singleton instance, created on first use so importing this module (e.g. from tests)
+# doesn't load the models
+_instance: Optional[YogaPoseEstimator] = None
+_instance_lock = threading.Lock()
+
+def get_estimator() -> YogaPoseEstimator:
+    """Return the shared YogaPoseEstimator, creating it on first call."""
+    global _instance
+    if _instance is None:
+        with _instance_lock:
+            if _instance is None:
+                _instance = YogaPoseEstimator(use_movenet_thunder=True, enable_smoothing=True)
+    return _instance
+
+def __getattr__(name: str):
+    """Keep `from ai.AdvancedYogaPoseEstimator import advanced_yoga_pose_estimator` working lazily."""
+    if name == 'advanced_yoga_pose_estimator':
+        return get_estimator()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,36 +1,55 @@
 # ai/groq_vision.py
-import os
 import base64
-import requests
 import json
 import logging
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Union
+
+from ai.groq_client import (
+    GROQ_API_KEY, SingleFlight, create_http_client, extract_json_object, post_chat_completion
+)
+
+# pybase64 is optional - base64 falls back to the stdlib codec without it
+try:
+    import pybase64 as _b64
+except ImportError:
+    _b64 = base64
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
-# Configure Groq API settings
-GROQ_API_KEY = os.environ.get("GROQ_API_KEY", "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")
-GROQ_API_ENDPOINT = "https://api.groq.com/openai/v1/chat/completions"
+# Shared Groq client, so concurrent request threads reuse pooled keep-alive connections
+_groq_client = create_http_client(GROQ_API_KEY)
+# Identical requests in flight at once (e.g. a client retrying a slow scan) share one Groq call
+_groq_inflight = SingleFlight()
+
+def _image_base64(image: Union[bytes, str]) -> str:
+    """Base64-encode image bytes; base64 strings are passed through without a data URI prefix."""
+    if isinstance(image, str):
+        return image.split("base64,", 1)[-1]
+    return _b64.b64encode(image).decode('ascii')
+
+def _post_groq(payload: Dict[str, Any]):
+    """POST a chat completion payload to Groq and return the response."""
+    body = json.dumps(payload).encode('utf-8')
+    return _groq_inflight.do(body, post_chat_completion, _groq_client, body)
 
 class GroqVision:
     """Groq Vision LLM integration for analyzing medical images"""
     
     @staticmethod
-    def analyze_prescription(image_path: str) -> Dict[str, Any]:
+    def analyze_prescription(image: Union[bytes, str]) -> Dict[str, Any]:
         """
         Analyze a prescription image using Groq Vision
         
         Args:
-            image_path: Path to the prescription image
+            image: Prescription image as JPEG bytes or a base64 string
             
         Returns:
             Dict containing extracted prescription information
         """
         try:
             # Convert image to base64
-            with open(image_path, "rb") as image_file:
-                base64_image = base64.b64encode(image_file.read()).decode('utf-8')
+            base64_image = _image_base64(image)
             
             # Create a more structured prompt for prescription analysis
             combined_prompt = """
@@ -62,27 +81,20 @@ class GroqVision:
             """
             
             # Call Groq Vision API
-            response = requests.post(
-                GROQ_API_ENDPOINT,
-                headers={
-                    "Content-Type": "application/json",
-                    "Authorization": f"Bearer {GROQ_API_KEY}"
-                },
-                json={
-                    "model": "llama-3.2-11b-vision-preview",  # Current supported Groq model
-                    "messages": [
-                        {
-                            "role": "user",
-                            "content": [
-                                {"type": "text", "text": combined_prompt},
-                                {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}}
-                            ]
-                        }
-                    ],
-                    "temperature": 0.2,
-                    "max_tokens": 1024
-                }
-            )
+            response = _post_groq({
+                "model": "llama-3.2-11b-vision-preview",  # Current supported Groq model
+                "messages": [
+                    {
+                        "role": "user",
+                        "content": [
+                            {"type": "text", "text": combined_prompt},
+                            {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}}
+                        ]
+                    }
+                ],
+                "temperature": 0.2,
+                "max_tokens": 1024
+            })
             
             # Parse the response
             if response.status_code == 200:
@@ -99,14 +111,9 @@ class GroqVision:
                 except json.JSONDecodeError:
                     # If not, try to extract JSON from the text (in case there's extra text)
                     try:
-                        # Look for JSON pattern
-                        import re
-                        json_pattern = r'({[\s\S]*})'
-                        match = re.search(json_pattern, content_text)
-                        if match:
-                            json_str = match.group(1)
-                            content = json.loads(json_str)
-                        else:
+                        # Look for the first complete JSON object
+                        content = extract_json_object(content_text)
+                        if content is None:
                             # Fallback to default structure
                             content = {"date": None, "medicines": []}
                     except Exception:
@@ -138,20 +145,19 @@ class GroqVision:
             }
     
     @staticmethod
-    def identify_medication(image_path: str) -> Dict[str, Any]:
+    def identify_medication(image: Union[bytes, str]) -> Dict[str, Any]:
         """
         Identify medication from an image using Groq Vision
         
         Args:
-            image_path: Path to the medication image
+            image: Medication image as JPEG bytes or a base64 string
             
         Returns:
             Dict containing identified medication information
         """
         try:
             # Convert image to base64
-            with open(image_path, "rb") as image_file:
-                base64_image = base64.b64encode(image_file.read()).decode('utf-8')
+            base64_image = _image_base64(image)
             
             # Create a structured prompt for medication identification
             combined_prompt = """
@@ -174,27 +180,20 @@ class GroqVision:
             """
             
             # Call Groq Vision API
-            response = requests.post(
-                GROQ_API_ENDPOINT,
-                headers={
-                    "Content-Type": "application/json",
-                    "Authorization": f"Bearer {GROQ_API_KEY}"
-                },
-                json={
-                    "model": "llama-3.2-11b-vision-preview",  # Current supported Groq model
-                    "messages": [
-                        {
-                            "role": "user",
-                            "content": [
-                                {"type": "text", "text": combined_prompt},
-                                {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}}
-                            ]
-                        }
-                    ],
-                    "temperature": 0.2,
-                    "max_tokens": 1024
-                }
-            )
+            response = _post_groq({
+                "model": "llama-3.2-11b-vision-preview",  # Current supported Groq model
+                "messages": [
+                    {
+                        "role": "user",
+                        "content": [
+                            {"type": "text", "text": combined_prompt},
+                            {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}}
+                        ]
+                    }
+                ],
+                "temperature": 0.2,
+                "max_tokens": 1024
+            })
             
             # Parse the response
             if response.status_code == 200:
@@ -210,14 +209,9 @@ class GroqVision:
                 except json.JSONDecodeError:
                     # If not, try to extract JSON from the text (in case there's extra text)
                     try:
-                        # Look for JSON pattern
-                        import re
-                        json_pattern = r'({[\s\S]*})'
-                        match = re.search(json_pattern, content_text)
-                        if match:
-                            json_str = match.group(1)
-                            content = json.loads(json_str)
-                        else:
+                        # Look for the first complete JSON object
+                        content = extract_json_object(content_text)
+                        if content is None:
                             # Fallback to default structure
                             content = {
                                 "name": None,
@@ -0,0 +1,108 @@
+# ai/groq_client.py
+import json
+import logging
+import os
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# httpx is optional - Groq calls use HTTP/2 through it, or a requests Session without it
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Read once here and shared by every Groq client; set it in the environment or .env
+GROQ_API_KEY = os.environ.get("GROQ_API_KEY")
+if not GROQ_API_KEY:
+    logger.warning("GROQ_API_KEY is not set, Groq calls will fail")
+GROQ_API_ENDPOINT = "https://api.groq.com/openai/v1/chat/completions"
+# (connect, read) timeouts in seconds for Groq requests
+GROQ_TIMEOUT = (3.05, 30)
+
+_JSON_DECODER = json.JSONDecoder()
+
+def extract_json_object(text: str) -> Optional[Any]:
+    """Parse the first complete JSON object embedded in an LLM response, or return None if there is none."""
+    start = text.find('{')
+    while start != -1:
+        try:
+            obj, _ = _JSON_DECODER.raw_decode(text, start)
+            return obj
+        except json.JSONDecodeError:
+            start = text.find('{', start + 1)
+    return None
+
+def create_http_client(api_key: str):
+    """
+    Create a pooled Groq HTTP client.
+
+    Uses httpx over HTTP/2 when httpx and h2 are installed, so concurrent calls
+    share one multiplexed connection; otherwise a requests Session.
+    """
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {api_key}"
+    }
+    if httpx is not None:
+        try:
+            return httpx.Client(
+                headers=headers,
+                timeout=httpx.Timeout(GROQ_TIMEOUT[1], connect=GROQ_TIMEOUT[0]),
+                limits=httpx.Limits(max_connections=16, max_keepalive_connections=4),
+                transport=httpx.HTTPTransport(http2=True, retries=2)
+            )
+        except ImportError:  # http2=True needs the h2 package
+            logger.info("h2 not installed, using requests for Groq calls")
+
+    session = requests.Session()
+    session.headers.update(headers)
+    session.mount("https://", HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=16,
+        max_retries=Retry(total=2, backoff_factor=0.2)
+    ))
+    return session
+
+def post_chat_completion(client, body: bytes):
+    """POST a serialized JSON request body to the Groq chat completions endpoint."""
+    if httpx is not None and isinstance(client, httpx.Client):
+        return client.post(GROQ_API_ENDPOINT, content=body)
+    return client.post(GROQ_API_ENDPOINT, data=body, timeout=GROQ_TIMEOUT)
+
+class SingleFlight:
+    """Coalesce concurrent identical calls: callers with the same key share one result."""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args) -> Any:
+        """Return fn(*args), or wait for the result of an in-flight call with the same key."""
+        with self._lock:
+            future = self._calls.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = Future()
+                self._calls[key] = future
+
+        if not is_leader:
+            return future.result()
+
+        try:
+            result = fn(*args)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
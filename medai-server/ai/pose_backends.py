@@ -0,0 +1,234 @@
+# ai/pose_backends.py
+"""
+MoveNet inference plumbing shared by the yoga pose estimators.
+"""
+import logging
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional, Sequence
+
+import numpy as np
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Where converted models are written, outside the package so builds never land in the
+# source tree; override with MEDAI_MODEL_CACHE_DIR (e.g. a volume shared by workers)
+MODEL_CACHE_DIR = os.environ.get("MEDAI_MODEL_CACHE_DIR") or os.path.join(
+    os.path.expanduser("~"), ".cache", "medai"
+)
+
+class InferenceWorker:
+    """
+    Runs a pose model on one dedicated thread, batching frames from concurrent requests.
+
+    Request threads submit single frames; the worker takes whatever is already
+    queued (up to max_batch) and hands it to run_batch in one call, so the model
+    is only ever driven from this thread and concurrent frames share a dispatch.
+    """
+
+    def __init__(self, run_batch: Callable[[List[Any]], Sequence[np.ndarray]],
+                 max_batch: int = 16, name: str = "movenet-inference"):
+        """
+        Args:
+            run_batch: Maps a list of frames to one (17, 3) keypoint array per frame
+            max_batch: Largest number of frames passed to run_batch at once
+            name: Name of the worker thread
+        """
+        self._run_batch = run_batch
+        self._max_batch = max_batch
+        self._queue = queue.Queue(maxsize=2 * max_batch)
+        threading.Thread(target=self._loop, name=name, daemon=True).start()
+
+    def submit(self, frame: Any) -> Future:
+        """Queue a frame; the returned future resolves to its keypoints."""
+        future = Future()
+        self._queue.put((frame, future))
+        return future
+
+    def run(self, frame: Any) -> np.ndarray:
+        """Run the model on one frame and wait for its keypoints."""
+        return self.submit(frame).result()
+
+    def _loop(self) -> None:
+        """Serve queued frames in batches."""
+        while True:
+            items = [self._queue.get()]
+
+            # Batch whatever else is already waiting without delaying the first frame
+            while len(items) < self._max_batch:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                outputs = self._run_batch([frame for frame, _ in items])
+            except Exception as e:
+                for _, future in items:
+                    future.set_exception(e)
+            else:
+                for (_, future), keypoints in zip(items, outputs):
+                    future.set_result(keypoints)
+
+class OnnxMoveNet:
+    """MoveNet exported to ONNX (e.g. with tf2onnx), run with ONNX Runtime on CPU."""
+
+    def __init__(self, model_path: str):
+        """
+        Load the model. Raises if onnxruntime is missing or the model can't be loaded,
+        so a configured backend never silently falls back to another one.
+
+        Args:
+            model_path: Path to the .onnx file
+        """
+        import onnxruntime as ort
+
+        # One intra-op thread: frames are already batched on the inference thread
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = 1
+        self._session = ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+        self._input_name = self._session.get_inputs()[0].name
+        # Preallocated int32 input, refilled in place for every frame
+        self._input = np.empty((1, 256, 256, 3), dtype=np.int32)
+        logger.info(f"Loaded MoveNet ONNX model from {model_path}")
+
+    def __call__(self, frames: np.ndarray) -> np.ndarray:
+        """
+        Args:
+            frames: (N, 256, 256, 3) uint8 letterboxed frames
+
+        Returns:
+            (N, 17, 3) array of [y, x, confidence] keypoints
+        """
+        # The exported singlepose model takes one frame at a time
+        outputs = np.empty((len(frames), 17, 3), dtype=np.float32)
+        for idx, frame in enumerate(frames):
+            np.copyto(self._input[0], frame)
+            outputs[idx] = self._session.run(None, {self._input_name: self._input})[0][0, 0]
+        return outputs
+
+class TfliteMoveNet:
+    """MoveNet TFLite model (e.g. the INT8-quantized Thunder build) run with the TFLite interpreter."""
+
+    def __init__(self, model_path: str):
+        """
+        Load the model. Raises if it can't be loaded, so a configured backend
+        never silently falls back to another one.
+
+        Args:
+            model_path: Path to a local .tflite file; nothing is downloaded
+        """
+        import tensorflow as tf
+
+        # TFLite applies the XNNPACK CPU delegate by default
+        self._interpreter = tf.lite.Interpreter(model_path=model_path, num_threads=os.cpu_count())
+        self._interpreter.allocate_tensors()
+
+        input_details = self._interpreter.get_input_details()[0]
+        self._input = input_details['index']
+        self._dtype = input_details['dtype']
+        self._output = self._interpreter.get_output_details()[0]['index']
+        logger.info(f"Loaded MoveNet TFLite model from {model_path}")
+
+    def __call__(self, frames: np.ndarray) -> np.ndarray:
+        """
+        Args:
+            frames: (N, 256, 256, 3) uint8 letterboxed frames
+
+        Returns:
+            (N, 17, 3) array of [y, x, confidence] keypoints
+        """
+        # The TFLite model takes one frame at a time
+        outputs = np.empty((len(frames), 17, 3), dtype=np.float32)
+        for idx, frame in enumerate(frames):
+            self._interpreter.set_tensor(self._input, frame[None].astype(self._dtype, copy=False))
+            self._interpreter.invoke()
+            outputs[idx] = self._interpreter.get_tensor(self._output)[0, 0]
+        return outputs
+
+def convert_movenet_trt_fp16(saved_model_dir: str, cache_name: str = "movenet_thunder_trt_fp16"):
+    """
+    Convert a MoveNet SavedModel to an FP16 TF-TRT graph for GPU inference.
+
+    The SavedModel signature is fixed to NHWC int32 input, so the layout is
+    left to TensorRT, which picks its own channels-first kernels internally.
+    The converted graph is saved under MODEL_CACHE_DIR and reloaded from there
+    on later starts. Raises if TF-TRT is unavailable or the conversion fails.
+
+    Args:
+        saved_model_dir: Directory of the MoveNet SavedModel (e.g. from hub.resolve)
+        cache_name: Subdirectory of MODEL_CACHE_DIR for the converted model
+
+    Returns:
+        Loaded converted model; its 'serving_default' signature runs inference
+    """
+    import tensorflow as tf
+
+    cache_dir = os.path.join(MODEL_CACHE_DIR, cache_name)
+    if not os.path.isdir(cache_dir):
+        from tensorflow.python.compiler.tensorrt import trt_convert as trt
+
+        converter = trt.TrtGraphConverterV2(
+            input_saved_model_dir=saved_model_dir,
+            precision_mode=trt.TrtPrecisionMode.FP16
+        )
+        converter.convert()
+        os.makedirs(MODEL_CACHE_DIR, exist_ok=True)
+        converter.save(cache_dir)
+        logger.info(f"Converted MoveNet to FP16 with TF-TRT, saved to {cache_dir}")
+
+    model = tf.saved_model.load(cache_dir)
+    logger.info(f"Loaded FP16 TF-TRT MoveNet from {cache_dir}")
+    return model
+
+def create_pose_landmarker(model_path: str, video: bool = False):
+    """
+    Create a MediaPipe Tasks pose landmarker from a .task bundle.
+
+    MEDIAPIPE_DELEGATE selects GPU (default) or CPU, which runs on XNNPACK.
+    Raises if the landmarker can't be created.
+
+    Args:
+        model_path: Path to the pose_landmarker .task file
+        video: Use VIDEO mode, tracking landmarks across timestamped frames of
+            one stream, instead of IMAGE mode for independent frames
+    """
+    from mediapipe.tasks.python import BaseOptions
+    from mediapipe.tasks.python import vision
+
+    delegate = os.environ.get("MEDIAPIPE_DELEGATE", "GPU").upper()
+    options = vision.PoseLandmarkerOptions(
+        base_options=BaseOptions(
+            model_asset_path=model_path,
+            delegate=getattr(BaseOptions.Delegate, delegate)
+        ),
+        running_mode=vision.RunningMode.VIDEO if video else vision.RunningMode.IMAGE,
+        num_poses=1
+    )
+    landmarker = vision.PoseLandmarker.create_from_options(options)
+    logger.info(f"Loaded MediaPipe pose landmarker from {model_path} ({delegate} delegate)")
+    return landmarker
+
+def detect_pose_landmarks(landmarker, image: np.ndarray, timestamp_ms: Optional[int] = None):
+    """
+    Run a Tasks pose landmarker on one frame.
+
+    Args:
+        landmarker: Landmarker from create_pose_landmarker
+        image: C-contiguous RGB uint8 image as numpy array
+        timestamp_ms: Frame timestamp, required (and strictly increasing) in VIDEO mode
+
+    Returns:
+        Landmarks of the first detected pose, or None if no pose was found
+    """
+    import mediapipe as mp
+
+    mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=image)
+    if timestamp_ms is None:
+        result = landmarker.detect(mp_image)
+    else:
+        result = landmarker.detect_for_video(mp_image, timestamp_ms)
+    return result.pose_landmarks[0] if result.pose_landmarks else None
@@ -3,6 +3,7 @@ import os
 import base64
 import numpy as np
 import logging
+import math
 import time
 import json
 from typing import Dict, List, Any
@@ -17,8 +18,7 @@ import mediapipe as mp
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Load environment variables
-GROQ_API_KEY = os.environ.get("GROQ_API_KEY", "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")
+from ai.groq_client import GROQ_API_KEY
 
 class SimpleYogaPoseEstimator:
     """A simplified yoga pose estimator using MediaPipe."""
@@ -201,8 +201,8 @@ class SimpleYogaPoseEstimator:
                     reference_pos = reference_dict[part]['position']
                     
                     # Calculate Euclidean distance
-                    distance = ((detected_pos['x'] - reference_pos['x']) ** 2 + 
-                                (detected_pos['y'] - reference_pos['y']) ** 2) ** 0.5
+                    distance = math.hypot(detected_pos['x'] - reference_pos['x'],
+                                          detected_pos['y'] - reference_pos['y'])
                     
                     # Convert to similarity (1.0 means perfect match)
                     # Make more sensitive by reducing the denominator
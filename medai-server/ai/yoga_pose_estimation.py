@@ -6,32 +6,571 @@ import cv2
 import time
 import json
 import logging
+import math
+import random
 import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
 from typing import Dict, List, Tuple, Any, Optional
 import requests
-from PIL import Image
-from io import BytesIO
 import tensorflow as tf
 import tensorflow_hub as hub
 
 # Keep MediaPipe as an optional fallback
 import mediapipe as mp
 
+from ai.groq_client import GROQ_API_KEY, SingleFlight, create_http_client, post_chat_completion
+from ai.pose_backends import (
+    InferenceWorker, OnnxMoveNet, TfliteMoveNet, convert_movenet_trt_fp16,
+    create_pose_landmarker, detect_pose_landmarks
+)
+
+# Numba is optional - position scoring falls back to NumPy without it
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+# libjpeg-turbo is optional - JPEG decoding falls back to OpenCV without it
+try:
+    from turbojpeg import TurboJPEG, TJPF_RGB
+    _turbo_jpeg = TurboJPEG()
+    # Downscaling factors libjpeg-turbo can apply during decode, smallest first
+    _TURBO_DOWNSCALES = sorted(
+        (sf for sf in _turbo_jpeg.scaling_factors if sf[0] < sf[1]), key=lambda sf: sf[0] / sf[1]
+    )
+except Exception:  # Python package or shared library missing
+    _turbo_jpeg = None
+    _TURBO_DOWNSCALES = []
+
+# pybase64 is optional - base64 falls back to the stdlib codec without it
+try:
+    import pybase64 as _b64
+except ImportError:
+    _b64 = base64
+
+# orjson is optional - JSON (de)serialization falls back to the stdlib without it
+try:
+    import orjson
+
+    def _json_dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj)
+
+    _json_loads = orjson.loads  # accepts bytes directly
+except ImportError:
+    orjson = None
+
+    def _json_dumps(obj: Any) -> bytes:
+        return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+    _json_loads = json.loads
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Load environment variables
-GROQ_API_KEY = os.environ.get("GROQ_API_KEY", "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")
-GROQ_API_ENDPOINT = "https://api.groq.com/openai/v1/chat/completions"
+# Keypoint names in MoveNet/COCO order
+KEYPOINT_NAMES = [
+    'nose', 'left_eye', 'right_eye', 'left_ear', 'right_ear',
+    'left_shoulder', 'right_shoulder', 'left_elbow', 'right_elbow',
+    'left_wrist', 'right_wrist', 'left_hip', 'right_hip',
+    'left_knee', 'right_knee', 'left_ankle', 'right_ankle'
+]
+_KP_INDEX = {name: idx for idx, name in enumerate(KEYPOINT_NAMES)}
+
+# MediaPipe Pose landmark index of each KEYPOINT_NAMES entry
+_LANDMARK_IDS = (0, 2, 5, 7, 8, 11, 12, 13, 14, 15, 16, 23, 24, 25, 26, 27, 28)
+
+# Keypoint record used inside the estimator, one row per KEYPOINT_NAMES entry;
+# each field reads as a column (keypoints['x'], keypoints['y'], keypoints['score'])
+KP_DTYPE = np.dtype([('x', 'f4'), ('y', 'f4'), ('score', 'f4')])
+
+
+def _as_dict_list(keypoints: np.ndarray) -> List[Dict[str, Any]]:
+    """Convert a KP_DTYPE keypoint array to the keypoint dictionaries returned by the API."""
+    return [
+        {
+            'part': name,
+            'position': {
+                'x': x,
+                'y': y
+            },
+            'score': score
+        }
+        for name, x, y, score in zip(
+            KEYPOINT_NAMES, keypoints['x'].tolist(), keypoints['y'].tolist(), keypoints['score'].tolist()
+        )
+    ]
+
+
+def _kp_positions(keypoints: np.ndarray) -> np.ndarray:
+    """Get the (N, 2) float64 x, y positions of a KP_DTYPE keypoint array."""
+    positions = np.empty((len(keypoints), 2))
+    positions[:, 0] = keypoints['x']
+    positions[:, 1] = keypoints['y']
+    return positions
+
+
+# Fixed keypoints (simplified mountain pose) used when no detection is available
+_DUMMY_KEYPOINTS = np.array([
+    (0.5, 0.1, 0.9),    # nose
+    (0.45, 0.09, 0.9),  # left_eye
+    (0.55, 0.09, 0.9),  # right_eye
+    (0.4, 0.1, 0.9),    # left_ear
+    (0.6, 0.1, 0.9),    # right_ear
+    (0.4, 0.25, 0.9),   # left_shoulder
+    (0.6, 0.25, 0.9),   # right_shoulder
+    (0.35, 0.4, 0.9),   # left_elbow
+    (0.65, 0.4, 0.9),   # right_elbow
+    (0.3, 0.55, 0.9),   # left_wrist
+    (0.7, 0.55, 0.9),   # right_wrist
+    (0.45, 0.55, 0.9),  # left_hip
+    (0.55, 0.55, 0.9),  # right_hip
+    (0.45, 0.75, 0.9),  # left_knee
+    (0.55, 0.75, 0.9),  # right_knee
+    (0.45, 0.95, 0.9),  # left_ankle
+    (0.55, 0.95, 0.9)   # right_ankle
+], dtype=KP_DTYPE)
+_DUMMY_KEYPOINTS.setflags(write=False)
+_DUMMY_KEYPOINT_DICTS = _as_dict_list(_DUMMY_KEYPOINTS)
+
+# Smallest shoulder width (normalized image units) usable as a scale for alignment
+_MIN_ALIGN_SCALE = 0.04
+# Shoulders narrower than this fraction of the torso length are treated as overlapping
+# (side-on view): the width is then mostly detection noise and no stable scale
+_MIN_SHOULDER_TORSO_RATIO = 0.25
+# Typical shoulder width in normalized image units, used to express image-unit
+# tolerances in shoulder widths for aligned poses
+_TYPICAL_SHOULDER_WIDTH = 0.2
+
+# Canonical reference keypoints for the supported poses, shipped with the package
+REFERENCE_POSES_PATH = os.path.join(os.path.dirname(__file__), 'data', 'reference_poses.json')
+
+
+def _load_reference_positions(path: str) -> Dict[str, np.ndarray]:
+    """
+    Load reference keypoint positions from a JSON file of {pose_id: [[x, y], ...]},
+    rows in KEYPOINT_NAMES order.
+    
+    Returns:
+        Dictionary of read-only (17, 2) float64 arrays
+    """
+    with open(path, 'rb') as f:
+        raw = _json_loads(f.read())
+    poses = {}
+    for pose_id, points in raw.items():
+        positions = np.array(points, dtype=np.float64)
+        if positions.shape != (len(KEYPOINT_NAMES), 2):
+            raise ValueError(f"Reference pose {pose_id} has shape {positions.shape}")
+        positions.setflags(write=False)
+        poses[pose_id] = positions
+    return poses
+
+
+# Reference keypoint positions (x, y) for each pose, loaded once at import so
+# every estimator shares them and no supported pose needs the LLM
+_REFERENCE_POSES = _load_reference_positions(REFERENCE_POSES_PATH)
+
+# The same reference poses as API keypoint dictionaries, also built once at import
+_REFERENCE_KPS = {
+    pose_id: [
+        {'part': name, 'position': {'x': x, 'y': y}, 'score': 1.0}
+        for name, (x, y) in zip(KEYPOINT_NAMES, positions.tolist())
+    ]
+    for pose_id, positions in _REFERENCE_POSES.items()
+}
+
+
+
+def _joint_angles(positions: np.ndarray, triplets: np.ndarray) -> np.ndarray:
+    """
+    Calculate the angle (in degrees) at the middle point of each triplet.
+    
+    Args:
+        positions: (17, 2) keypoint positions
+        triplets: (M, 3) keypoint indices, vertex in the middle
+        
+    Returns:
+        (M,) angles, NaN where a limb has zero length
+    """
+    ba = positions[triplets[:, 0]] - positions[triplets[:, 1]]
+    bc = positions[triplets[:, 2]] - positions[triplets[:, 1]]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cosine_angle = np.sum(ba * bc, axis=1) / (np.linalg.norm(ba, axis=1) * np.linalg.norm(bc, axis=1))
+    return np.degrees(np.arccos(np.clip(cosine_angle, -1.0, 1.0)))
+
+
+def _vertex_cosine(positions, a, b, c):
+    """Cosine of the angle at keypoint b between keypoints a and c; NaN for a zero-length limb."""
+    bax = positions[a, 0] - positions[b, 0]
+    bay = positions[a, 1] - positions[b, 1]
+    bcx = positions[c, 0] - positions[b, 0]
+    bcy = positions[c, 1] - positions[b, 1]
+    norms = math.sqrt(bax * bax + bay * bay) * math.sqrt(bcx * bcx + bcy * bcy)
+    if norms == 0.0:
+        return math.nan
+    return min(1.0, max(-1.0, (bax * bcx + bay * bcy) / norms))
+
+
+def _align_pose(positions: np.ndarray) -> Optional[np.ndarray]:
+    """
+    Express (17, 2) keypoint positions relative to the pelvis (mid-hip), in
+    units of shoulder width, so camera distance and framing do not affect scoring.
+    
+    Returns:
+        Aligned positions, or None when the hips or shoulders are missing or the
+        shoulders overlap (side-on view) and no stable scale exists
+    """
+    left_shoulder = positions[_KP_INDEX['left_shoulder']]
+    right_shoulder = positions[_KP_INDEX['right_shoulder']]
+    pelvis = 0.5 * (positions[_KP_INDEX['left_hip']] + positions[_KP_INDEX['right_hip']])
+    scale = math.hypot(*(left_shoulder - right_shoulder))
+    torso = math.hypot(*(0.5 * (left_shoulder + right_shoulder) - pelvis))
+    min_scale = max(_MIN_ALIGN_SCALE, _MIN_SHOULDER_TORSO_RATIO * torso)
+    if not scale >= min_scale or np.isnan(pelvis).any():  # also catches NaN scale
+        return None
+    return (positions - pelvis) / scale
+
+
+def _pose_score_loop(detected, reference, indices, weights, tolerances, triplets):
+    """
+    Weighted position and joint-angle similarity of two (17, 2) keypoint arrays.
+    Each part scores clip(1 - distance / tolerance, 0, 1); parts that are NaN
+    in either pose are skipped.
+    
+    Returns:
+        (score, total_weight) tuple
+    """
+    score = 0.0
+    total_weight = 0.0
+    
+    # Position similarity for the weighted parts
+    for k in range(indices.shape[0]):
+        i = indices[k]
+        dx = detected[i, 0] - reference[i, 0]
+        dy = detected[i, 1] - reference[i, 1]
+        distance = math.sqrt(dx * dx + dy * dy)
+        if distance != distance:  # NaN - part missing from either pose
+            continue
+        score += min(1.0, max(0.0, 1.0 - distance / tolerances[k])) * weights[k]
+        total_weight += weights[k]
+    
+    # Joint angle similarity, weight 1.0 each
+    for k in range(triplets.shape[0]):
+        a = triplets[k, 0]
+        b = triplets[k, 1]
+        c = triplets[k, 2]
+        if (math.isnan(detected[a, 0]) or math.isnan(detected[b, 0]) or math.isnan(detected[c, 0]) or
+                math.isnan(reference[a, 0]) or math.isnan(reference[b, 0]) or math.isnan(reference[c, 0])):
+            continue
+        total_weight += 1.0
+        cos_d = _vertex_cosine(detected, a, b, c)
+        cos_r = _vertex_cosine(reference, a, b, c)
+        # cos(angle_d - angle_r) <= 0 means the angles are 90+ degrees apart and the
+        # joint scores 0, so skip the arccos; angles are in [0, 180] so sin >= 0
+        if cos_d * cos_r + math.sqrt(1.0 - cos_d * cos_d) * math.sqrt(1.0 - cos_r * cos_r) <= 0.0:
+            continue
+        similarity = 1.0 - abs(math.degrees(math.acos(cos_d)) - math.degrees(math.acos(cos_r))) / 90.0
+        if similarity > 0.0:  # False for NaN, so degenerate limbs score 0
+            score += similarity
+    
+    return score, total_weight
+
+
+def _pose_score_numpy(detected, reference, indices, weights, tolerances, triplets):
+    """NumPy equivalent of _pose_score_loop."""
+    # Position similarity for the weighted parts, masked rather than filtered
+    distances = np.linalg.norm(detected[indices] - reference[indices], axis=1)
+    present = ~np.isnan(distances)
+    similarities = np.where(present, np.clip(1.0 - distances / tolerances, 0.0, 1.0), 0.0)
+    score = float(similarities @ weights)
+    total_weight = float(present @ weights)
+    
+    # Joint angle similarity for triplets present in both poses
+    present = ~(np.isnan(detected[triplets]).any(axis=(1, 2)) | np.isnan(reference[triplets]).any(axis=(1, 2)))
+    triplets = triplets[present]
+    angle_diff = np.abs(_joint_angles(detected, triplets) - _joint_angles(reference, triplets))
+    score += float(np.fmax(0.0, 1.0 - angle_diff / 90.0).sum())
+    total_weight += float(len(triplets))
+    
+    return score, total_weight
+
+
+# Only the fastmath flags that keep NaN/inf semantics: 'nnan'/'ninf' would let LLVM
+# drop the missing-part checks
+_FASTMATH = {'contract', 'arcp', 'reassoc', 'nsz'}
+if njit is not None:
+    _vertex_cosine = njit(cache=True, fastmath=_FASTMATH)(_vertex_cosine)
+    _pose_score = njit(cache=True, fastmath=_FASTMATH)(_pose_score_loop)
+else:
+    _pose_score = _pose_score_numpy
+
+
+# Display names for the supported poses
+POSE_NAMES = {
+    '1-1': 'Modified Mountain Pose',
+    '1-2': 'Cat-Cow Stretch',
+    '1-3': 'Seated Side Stretch',
+    '2-1': 'Warrior II',
+    '2-2': 'Wide-Legged Forward Fold',
+    '2-3': 'Supported Triangle Pose',
+    '3-1': 'Modified Squat',
+    '3-2': 'Seated Butterfly',
+    '3-3': 'Side-Lying Relaxation'
+}
+
+# Title, short description and trimester of each supported pose
+_POSE_INFO = {
+    '1-1': {
+        'title': 'Modified Mountain Pose',
+        'description': 'Stand tall with feet hip-width apart, arms at sides. Draw shoulders back and down, engage core gently.',
+        'trimester': 'first'
+    },
+    '1-2': {
+        'title': 'Cat-Cow Stretch',
+        'description': 'Start on hands and knees. Alternate between arching back (cow) and rounding spine (cat).',
+        'trimester': 'first'
+    },
+    '1-3': {
+        'title': 'Seated Side Stretch',
+        'description': 'Sit cross-legged, reach one arm overhead and lean to opposite side. Hold and repeat on other side.',
+        'trimester': 'first'
+    },
+    '2-1': {
+        'title': 'Warrior II',
+        'description': 'Step feet wide apart, turn one foot out. Bend knee over ankle, extend arms and gaze over front hand.',
+        'trimester': 'second'
+    },
+    '2-2': {
+        'title': 'Wide-Legged Forward Fold',
+        'description': 'Step feet wide apart, fold forward from hips. Rest hands on floor or blocks if needed.',
+        'trimester': 'second'
+    },
+    '2-3': {
+        'title': 'Supported Triangle Pose',
+        'description': 'Step feet wide apart, extend one arm down to shin/block/floor and the other arm up.',
+        'trimester': 'second'
+    },
+    '3-1': {
+        'title': 'Modified Squat',
+        'description': 'Stand with feet wider than hips, lower into squat. Use wall or chair for support if needed.',
+        'trimester': 'third'
+    },
+    '3-2': {
+        'title': 'Seated Butterfly',
+        'description': 'Sit with soles of feet together, knees out to sides. Sit on blanket for support if needed.',
+        'trimester': 'third'
+    },
+    '3-3': {
+        'title': 'Side-Lying Relaxation',
+        'description': 'Lie on left side with pillows supporting head, belly, and between knees.',
+        'trimester': 'third'
+    }
+}
+
+# Output index of each pose in the pose classification model
+_POSE_CLASS_INDEX = {
+    '1-1': 0,  # Mountain pose
+    '1-2': 1,  # Cat-Cow
+    '1-3': 2,  # Seated side stretch
+    '2-1': 3,  # Warrior II
+    '2-2': 4,  # Wide-legged forward fold
+    '2-3': 5,  # Triangle pose
+    '3-1': 6,  # Modified squat
+    '3-2': 7,  # Seated butterfly
+    '3-3': 8   # Side-lying relaxation
+}
+
+# Pregnancy safety instructions to include in every feedback prompt
+_PREGNANCY_SAFETY = """
+            Remember that this is a pregnant woman, so feedback must prioritize safety. 
+            Caution against:
+            - Deep twists that compress the abdomen
+            - Poses that put pressure on the belly
+            - Holding breath
+            - Overstretching (due to relaxin hormone)
+            - Lying flat on back after first trimester
+            
+            Encourage:
+            - Modified poses with props if needed
+            - Widening stance for balance
+            - Listening to the body and backing off if uncomfortable
+            """
+
+
+def _build_feedback_prompt(pose_name: str, is_final: bool) -> str:
+    """Build the static feedback prompt for a pose, leaving {accuracy} and {issues_text} to fill per call."""
+    final_note = "This is their final feedback for this practice session, so include overall summary comments." if is_final else ""
+    return f"""
+            You are a specialized prenatal yoga instructor providing feedback to a pregnant woman. 
+            
+            TASK: Analyze the yoga pose image and provide helpful guidance on proper alignment and technique for the {pose_name}.
+            
+            Current accuracy score: {{accuracy:.1f}}% 
+            
+            {{issues_text}}
+            
+            {_PREGNANCY_SAFETY}
+            
+            For this specific pose ({pose_name}), provide:
+            1. Brief 1-2 sentence assessment of overall alignment
+            2. 2-3 specific, actionable cues to improve the pose
+            3. One encouraging statement
+            
+            Your feedback should be clear, supportive, and focused on safety for pregnancy.
+            
+            {final_note}
+            
+            Keep your response under 150 words.
+            """
+
+
+_PROMPT_BY_POSE = {pose_id: _build_feedback_prompt(name, False) for pose_id, name in POSE_NAMES.items()}
+_PROMPT_BY_POSE_FINAL = {pose_id: _build_feedback_prompt(name, True) for pose_id, name in POSE_NAMES.items()}
+
+# Encouragement returned instead of calling Groq when a (non-final) pose is already good
+_GOOD_POSE_PHRASES = (
+    "Beautiful {pose_name}! Your alignment looks great - keep breathing steadily and hold.",
+    "Lovely work. Your {pose_name} is well aligned; stay relaxed and keep your breath slow and even.",
+    "Great form in {pose_name}. Keep your shoulders soft and listen to your body.",
+    "You're holding {pose_name} really well. Stay grounded and breathe into the stretch.",
+    "Excellent {pose_name}! Keep this steady posture and move out of it gently when you're ready.",
+    "Your {pose_name} looks strong and balanced. Keep breathing and enjoy the pose.",
+    "Nicely done - {pose_name} is right where it should be. Stay comfortable and don't push further.",
+    "Wonderful alignment in {pose_name}. Keep a gentle, steady breath and hold as long as it feels good.",
+    "Well balanced {pose_name}. Keep your core gently engaged and your breathing calm.",
+    "That's a great {pose_name}. Keep holding with ease and stop if anything feels uncomfortable.",
+)
+
+# Static part of the Groq feedback request body
+_FEEDBACK_REQUEST = {
+    "model": "llama-3.2-11b-vision-preview",  # Current supported Groq model
+    "temperature": 0.2,
+    "max_tokens": 1024
+}
+
+# Largest side and JPEG quality of frames uploaded to Groq Vision
+FEEDBACK_IMAGE_MAX_SIDE = 768
+FEEDBACK_IMAGE_QUALITY = 75
+
+
+@lru_cache(maxsize=4)
+def _encode_image_base64(image_data: bytes) -> str:
+    """
+    Downscale a frame for Groq Vision and base64-encode it.
+    Memoizes the last few frames, keyed on the bytes themselves.
+    """
+    image = cv2.imdecode(np.frombuffer(image_data, np.uint8), cv2.IMREAD_COLOR)
+    if image is not None:
+        height, width = image.shape[:2]
+        scale = FEEDBACK_IMAGE_MAX_SIDE / max(height, width)
+        if scale < 1:
+            image = cv2.resize(image, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+        ok, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, FEEDBACK_IMAGE_QUALITY])
+        if ok:
+            image_data = buffer.tobytes()
+    
+    # b64encode output is pure ASCII, so skip the UTF-8 validation path
+    return _b64.b64encode(image_data).decode('ascii')
 
 class YogaPoseEstimator:
     """YogaPoseEstimator model for analyzing and providing feedback on yoga poses."""
     
-    def __init__(self):
-        """Initialize the YogaPoseEstimator with TensorFlow and MediaPipe."""
-        # Reference pose data cache
-        self._reference_poses = {}
+    # Largest number of frames sent to MoveNet in one dispatch
+    _MAX_BATCH = 16
+    
+    # Most reference poses (known or not) kept by get_reference_pose
+    _REFERENCE_CACHE_SIZE = 64
+    
+    # Poses at or above this accuracy get canned encouragement instead of a Groq call
+    _GOOD_POSE_ACCURACY = 90.0
+    
+    # Longest side of frames handed to MediaPipe, which runs its model at 256x256 anyway
+    _MEDIAPIPE_MAX_SIDE = 384
+    # JPEGs are downscaled while decoding, but never below this longest side
+    _DECODE_MIN_SIDE = 384
+    
+    # Important keypoints and their weights for position scoring
+    _WEIGHT_PARTS = (
+        'left_shoulder', 'right_shoulder', 'left_hip', 'right_hip',
+        'left_knee', 'right_knee', 'left_ankle', 'right_ankle',
+        'left_elbow', 'right_elbow', 'left_wrist', 'right_wrist'
+    )
+    _WEIGHT_IDX = np.array([_KP_INDEX[part] for part in _WEIGHT_PARTS])
+    _WEIGHTS = np.array([1.5, 1.5, 1.5, 1.5, 1.2, 1.2, 1.0, 1.0, 1.0, 1.0, 0.8, 0.8])
+    # Distance (normalized image units) at which a part's position score reaches zero,
+    # by trimester - more lenient as the pregnancy progresses
+    _TOLERANCES = {
+        'first': np.full(len(_WEIGHT_PARTS), 0.25),
+        'second': np.full(len(_WEIGHT_PARTS), 0.3),
+        'third': np.full(len(_WEIGHT_PARTS), 0.35)
+    }
+    # The same tolerances in shoulder widths, for pelvis-aligned poses (0.3 -> 1.5)
+    _ALIGNED_TOLERANCES = {
+        trimester: tolerances / _TYPICAL_SHOULDER_WIDTH for trimester, tolerances in _TOLERANCES.items()
+    }
+    
+    # Classifier features: angle triplets (vertex in the middle) and joint distance pairs
+    _FEATURE_ANGLE_IDX = np.array([
+        [_KP_INDEX[a], _KP_INDEX[b], _KP_INDEX[c]] for a, b, c in [
+            ('nose', 'left_shoulder', 'right_shoulder'),      # Head/Neck
+            ('left_elbow', 'left_shoulder', 'left_hip'),      # Shoulders
+            ('right_elbow', 'right_shoulder', 'right_hip'),
+            ('left_wrist', 'left_elbow', 'left_shoulder'),    # Elbows
+            ('right_wrist', 'right_elbow', 'right_shoulder'),
+            ('left_shoulder', 'left_hip', 'left_knee'),       # Hips
+            ('right_shoulder', 'right_hip', 'right_knee'),
+            ('left_hip', 'left_knee', 'left_ankle'),          # Knees
+            ('right_hip', 'right_knee', 'right_ankle')
+        ]
+    ])
+    _FEATURE_DIST_IDX = np.array([
+        [_KP_INDEX[a], _KP_INDEX[b]] for a, b in [
+            ('left_shoulder', 'right_shoulder'),  # Shoulder width
+            ('left_hip', 'right_hip'),            # Hip width
+            ('left_shoulder', 'left_hip'),        # Torso height left
+            ('right_shoulder', 'right_hip'),      # Torso height right
+            ('left_knee', 'left_ankle'),          # Lower leg left
+            ('right_knee', 'right_ankle'),        # Lower leg right
+            ('left_hip', 'left_knee'),            # Upper leg left
+            ('right_hip', 'right_knee'),          # Upper leg right
+            ('left_elbow', 'left_wrist'),         # Lower arm left
+            ('right_elbow', 'right_wrist')        # Lower arm right
+        ]
+    ])
+    
+    # Joint angle triplets (vertex in the middle) compared during evaluation
+    _ANGLE_TRIPLETS = np.array([
+        [_KP_INDEX[a], _KP_INDEX[b], _KP_INDEX[c]] for a, b, c in [
+            ('left_shoulder', 'left_elbow', 'left_wrist'),
+            ('right_shoulder', 'right_elbow', 'right_wrist'),
+            ('left_hip', 'left_knee', 'left_ankle'),
+            ('right_hip', 'right_knee', 'right_ankle'),
+            ('left_hip', 'left_shoulder', 'left_elbow'),
+            ('right_hip', 'right_shoulder', 'right_elbow')
+        ]
+    ])
+    
+    def __init__(self, stream_static_image_mode: bool = False, stream_model_complexity: int = 0):
+        """
+        Initialize the YogaPoseEstimator with TensorFlow and MediaPipe.
+        
+        Args:
+            stream_static_image_mode: Run MediaPipe detection on every realtime frame
+                instead of tracking landmarks between frames
+            stream_model_complexity: MediaPipe model complexity (0-2) for realtime frames;
+                0 is the lite model, about half the FLOPs of the full one
+        """
+        # Reference pose cache, bounded because pose ids come straight from requests
+        self._reference_pose_cache = lru_cache(maxsize=self._REFERENCE_CACHE_SIZE)(self._build_reference_pose)
+        self._last_error_time = 0  # For error rate limiting
+        
+        # In-flight feedback requests, keyed by (pose_id, is_final, image_data)
+        self._inflight_feedback = SingleFlight()
+        
+        # Pooled HTTP client so Groq calls reuse keep-alive TLS connections
+        self._http = create_http_client(GROQ_API_KEY)
         
         # Initialize MediaPipe Pose as backup
         self.mp_pose = mp.solutions.pose
@@ -41,12 +580,31 @@ class YogaPoseEstimator:
             enable_segmentation=False,
             min_detection_confidence=0.5
         )
+        # Lighter tracking instance for realtime frames (estimate_pose)
+        self._stream_pose = self.mp_pose.Pose(
+            static_image_mode=stream_static_image_mode,
+            model_complexity=stream_model_complexity,
+            enable_segmentation=False,
+            min_detection_confidence=0.5
+        )
+        # MediaPipe graphs are not thread-safe; serialize calls per instance
+        self._pose_lock = threading.Lock()
+        self._stream_pose_lock = threading.Lock()
+        
+        # Optional Tasks API landmarker (GPU delegate by default) that replaces the
+        # stream instance for realtime frames; once configured it must load
+        self._landmarker = None
+        self._landmarker_ts = 0
+        task_path = os.environ.get("MEDIAPIPE_POSE_TASK_PATH")
+        if task_path:
+            self._landmarker = create_pose_landmarker(task_path, video=True)
         
         # Load TensorFlow model
         try:
             # MoveNet model from TensorFlow Hub
             model_name = "movenet_thunder"  # More accurate than lightning
-            self.pose_model = hub.load(f"https://tfhub.dev/google/movenet/singlepose/thunder/4")
+            model_url = "https://tfhub.dev/google/movenet/singlepose/thunder/4"
+            self.pose_model = hub.load(model_url)
             self.movenet = self.pose_model.signatures['serving_default']
             logger.info("Loaded MoveNet Thunder model from TensorFlow Hub")
             self.tf_model_loaded = True
@@ -55,6 +613,29 @@ class YogaPoseEstimator:
             logger.info("Using MediaPipe as fallback")
             self.tf_model_loaded = False
         
+        # Opt-in FP16 TensorRT build of the same graph for GPU hosts; once enabled it must
+        # convert (or load from its cache), so a broken TF-TRT setup fails startup
+        if os.environ.get("MOVENET_TRT_FP16") == "1":
+            self.pose_model = convert_movenet_trt_fp16(hub.resolve(model_url))
+            self.movenet = self.pose_model.signatures['serving_default']
+            self.tf_model_loaded = True
+        
+        # Optional ONNX Runtime backend for an exported MoveNet model; once configured
+        # it must load, so a bad path fails startup instead of silently switching backends
+        self._ort = None
+        onnx_path = os.environ.get("MOVENET_ONNX_PATH")
+        if onnx_path:
+            self._ort = OnnxMoveNet(onnx_path)
+            self.tf_model_loaded = True
+        
+        # Optional local TFLite MoveNet (e.g. the INT8 Thunder build) for CPU-only hosts,
+        # opted into with MOVENET_TFLITE_PATH; nothing is downloaded and it must load
+        self.tflite = None
+        tflite_path = os.environ.get("MOVENET_TFLITE_PATH")
+        if tflite_path:
+            self.tflite = TfliteMoveNet(tflite_path)
+            self.tf_model_loaded = True
+        
         # Load pose classification model if available
         try:
             # Path to your yoga pose classification model
@@ -70,119 +651,216 @@ class YogaPoseEstimator:
             logger.error(f"Failed to load classification model: {e}")
             self.classifier_loaded = False
             
+        # Per-thread RGB decode buffers for synchronous callers (see preprocess_image)
+        self._decode_local = threading.local()
+        
+        # Decode/resize release the GIL, so run them on a small pool to overlap requests
+        self._preprocess_pool = ThreadPoolExecutor(
+            max_workers=min(8, os.cpu_count() or 1),
+            thread_name_prefix="pose-preprocess"
+        )
+        
+        # Contiguous letterbox slab reused for every batch (MoveNet input is 256x256)
+        self._input_slab = np.zeros((self._MAX_BATCH, 256, 256, 3), dtype=np.uint8)
+        # Dedicated MoveNet inference thread; request threads submit frames to it
+        if self.tf_model_loaded:
+            self._infer = InferenceWorker(self._run_movenet, max_batch=self._MAX_BATCH)
+        
+        # Warm the reference pose cache so no request pays for building it
+        self._load_reference_poses()
+        # Compile (or load from cache) the scoring kernel now rather than on the first frame
+        self.evaluate_pose(_REFERENCE_POSES['1-1'], _REFERENCE_POSES['1-1'])
+            
         logger.info("Initialized Yoga Pose Estimator")
     
-    def preprocess_image(self, image_data: bytes) -> np.ndarray:
+    def _load_reference_poses(self):
+        """Pre-populate the reference pose cache with all known poses."""
+        for pose_id in _REFERENCE_POSES:
+            self.get_reference_pose(pose_id)
+    
+    def preprocess_image(self, image_data: bytes, reuse_buffer: bool = False) -> np.ndarray:
         """
         Preprocess the input image for the pose estimation model.
         
         Args:
             image_data: JPEG image data as bytes
+            reuse_buffer: Decode JPEGs into this thread's scratch buffer instead of a new
+                array; only for callers that are done with the image before their next decode
             
         Returns:
             Preprocessed image as numpy array
         """
         try:
-            # Convert to PIL Image
-            image = Image.open(BytesIO(image_data))
+            # Decode JPEGs straight to RGB with libjpeg-turbo's SIMD decoder
+            if _turbo_jpeg is not None and image_data[:2] == b'\xff\xd8':
+                try:
+                    # Let the IDCT shrink large frames (1/2, 1/4, 1/8) instead of resizing later
+                    width, height, _, _ = _turbo_jpeg.decode_header(image_data)
+                    scaling_factor = self._jpeg_scaling_factor(max(width, height))
+                    if not reuse_buffer:
+                        return _turbo_jpeg.decode(image_data, pixel_format=TJPF_RGB,
+                                                  scaling_factor=scaling_factor)
+                    num, denom = scaling_factor
+                    width = (width * num + denom - 1) // denom
+                    height = (height * num + denom - 1) // denom
+                    rgb = getattr(self._decode_local, 'rgb', None)
+                    if rgb is None or rgb.shape[:2] != (height, width):
+                        rgb = self._decode_local.rgb = np.empty((height, width, 3), dtype=np.uint8)
+                    _turbo_jpeg.decode(image_data, pixel_format=TJPF_RGB,
+                                       scaling_factor=scaling_factor, dst=rgb)
+                    return rgb
+                except OSError as e:  # Corrupt or unsupported JPEG - let OpenCV try
+                    logger.debug("libjpeg-turbo decode failed, falling back to OpenCV: %s", e)
+            
+            # Otherwise decode from the byte buffer with OpenCV
+            image_bgr = cv2.imdecode(np.frombuffer(image_data, np.uint8), cv2.IMREAD_COLOR)
+            if image_bgr is None:
+                raise ValueError("Could not decode image data")
             
             # Convert to RGB format (for consistency)
-            image = image.convert('RGB')
-            
-            # Convert to numpy array
-            image_np = np.array(image)
-            
-            return image_np
+            return cv2.cvtColor(image_bgr, cv2.COLOR_BGR2RGB)
         
         except Exception as e:
             logger.error(f"Error in preprocessing image: {str(e)}")
             # Return a default image if processing fails
             return np.zeros((368, 368, 3), dtype=np.uint8)
     
-    def detect_pose_with_tf(self, image: np.ndarray) -> List[Dict[str, Any]]:
+    def _jpeg_scaling_factor(self, longest_side: int) -> Tuple[int, int]:
+        """Pick the smallest libjpeg-turbo scaling factor that keeps the longest side >= _DECODE_MIN_SIDE."""
+        for num, denom in _TURBO_DOWNSCALES:
+            if longest_side * num >= self._DECODE_MIN_SIDE * denom:
+                return num, denom
+        return 1, 1
+    
+    def preprocess_async(self, image_data: bytes) -> Future:
         """
-        Detect pose keypoints using TensorFlow MoveNet.
+        Preprocess an image on the preprocessing pool.
         
         Args:
-            image: Preprocessed image as numpy array
+            image_data: JPEG image data as bytes
             
         Returns:
-            List of keypoint dictionaries
+            Future resolving to the preprocessed image
         """
-        try:
-            # Resize and pad the image to the model's expected input dimensions
-            input_size = 256  # MoveNet input size
-            height, width, _ = image.shape
-            
-            # Calculate scale and padding
-            scale = min(input_size / height, input_size / width)
-            scaled_height = int(height * scale)
-            scaled_width = int(width * scale)
-            
-            # Resize image
-            resized_image = cv2.resize(image, (scaled_width, scaled_height))
-            
-            # Create empty image with desired dimensions
-            input_image = np.zeros((input_size, input_size, 3), dtype=np.uint8)
-            
-            # Place the resized image in the center
-            y_offset = (input_size - scaled_height) // 2
-            x_offset = (input_size - scaled_width) // 2
-            input_image[y_offset:y_offset+scaled_height, x_offset:x_offset+scaled_width, :] = resized_image
+        return self._preprocess_pool.submit(self.preprocess_image, image_data)
+    
+    def preprocess_batch(self, images: List[bytes]) -> List[np.ndarray]:
+        """
+        Preprocess several images in parallel on the preprocessing pool.
+        
+        Args:
+            images: JPEG image data as bytes, one entry per frame
             
-            # Convert to tensor
-            input_tensor = tf.convert_to_tensor(input_image)
-            input_tensor = tf.expand_dims(input_tensor, axis=0)
-            input_tensor = tf.cast(input_tensor, dtype=tf.int32)
+        Returns:
+            Preprocessed images as numpy arrays, in input order
+        """
+        # Each decode gets a fresh array - frames outlive the worker's next decode
+        return list(self._preprocess_pool.map(self.preprocess_image, images))
+    
+    def _letterbox(self, image: np.ndarray, out: np.ndarray) -> None:
+        """
+        Resize an image to fit the MoveNet input and center it in a uint8 canvas.
+        
+        Args:
+            image: Preprocessed image as numpy array
+            out: Zeroed (input_size, input_size, 3) uint8 canvas to fill in place
+        """
+        input_size = out.shape[0]
+        height, width, _ = image.shape
+        
+        # Calculate scale and padding
+        scale = min(input_size / height, input_size / width)
+        scaled_height = int(height * scale)
+        scaled_width = int(width * scale)
+        
+        # Resize straight into the centered region of the canvas
+        y_offset = (input_size - scaled_height) // 2
+        x_offset = (input_size - scaled_width) // 2
+        region = out[y_offset:y_offset+scaled_height, x_offset:x_offset+scaled_width, :]
+        resized_image = cv2.resize(image, (scaled_width, scaled_height), dst=region, interpolation=cv2.INTER_AREA)
+        if resized_image is not region:  # OpenCV could not write into the view
+            region[...] = resized_image
+    
+    def _movenet_to_keypoints(self, keypoints: np.ndarray) -> np.ndarray:
+        """
+        Convert a (17, 3) MoveNet output array to a keypoint array.
+        
+        Args:
+            keypoints: MoveNet keypoints as [y, x, confidence] rows
             
-            # Run inference
-            results = self.movenet(input_tensor)
-            keypoints = results['output_0'].numpy().squeeze()
-            
-            # Format keypoints from MoveNet format to our format
-            formatted_keypoints = []
-            
-            # MoveNet keypoint mapping to our keypoint format
-            # MoveNet keypoints: [nose, left_eye, right_eye, left_ear, right_ear, left_shoulder, 
-            # right_shoulder, left_elbow, right_elbow, left_wrist, right_wrist, left_hip, 
-            # right_hip, left_knee, right_knee, left_ankle, right_ankle]
-            keypoint_names = [
-                'nose', 'left_eye', 'right_eye', 'left_ear', 'right_ear',
-                'left_shoulder', 'right_shoulder', 'left_elbow', 'right_elbow',
-                'left_wrist', 'right_wrist', 'left_hip', 'right_hip',
-                'left_knee', 'right_knee', 'left_ankle', 'right_ankle'
-            ]
+        Returns:
+            (17,) KP_DTYPE array with coordinates clamped to [0, 1]
+        """
+        # MoveNet returns [y, x, confidence] rows in KEYPOINT_NAMES order
+        result = np.empty(len(KEYPOINT_NAMES), dtype=KP_DTYPE)
+        result['x'] = np.clip(keypoints[:, 1], 0.0, 1.0)
+        result['y'] = np.clip(keypoints[:, 0], 0.0, 1.0)
+        result['score'] = keypoints[:, 2]
+        return result
+    
+    def _run_movenet(self, images: List[np.ndarray]) -> np.ndarray:
+        """
+        Run MoveNet on one or more frames in a single dispatch.
+        Only called from the inference thread, which owns the input slab.
+        
+        Args:
+            images: Up to _MAX_BATCH preprocessed images as numpy arrays
             
-            for idx, name in enumerate(keypoint_names):
-                # MoveNet returns [y, x, confidence] for each keypoint
-                y, x, confidence = keypoints[idx]
-                
-                # Convert to absolute coordinates
-                x_abs = min(max(0, x), 1.0)  # Normalize to [0, 1]
-                y_abs = min(max(0, y), 1.0)  # Normalize to [0, 1]
-                
-                formatted_keypoints.append({
-                    'part': name,
-                    'position': {
-                        'x': float(x_abs),
-                        'y': float(y_abs)
-                    },
-                    'score': float(confidence)
-                })
+        Returns:
+            (N, 17, 3) array of [y, x, confidence] keypoints
+        """
+        # Letterbox every frame into the leading rows of the reusable uint8 slab
+        input_batch = self._input_slab[:len(images)]
+        input_batch.fill(0)
+        for idx, image in enumerate(images):
+            self._letterbox(image, input_batch[idx])
+        
+        if self._ort is not None:
+            return self._ort(input_batch)
+        
+        if self.tflite is not None:
+            return self.tflite(input_batch)
+        
+        # MoveNet v4 expects int32 input - convert the uint8 canvas in one cast
+        input_tensor = tf.cast(tf.convert_to_tensor(input_batch), dtype=tf.int32)
+        
+        if len(images) == 1:
+            return self.movenet(input_tensor)['output_0'].numpy()[:, 0]
+        
+        # The singlepose signature is fixed at batch size 1, so map it over
+        # the batch inside one graph call instead of N Python round-trips
+        return tf.map_fn(
+            lambda frame: self.movenet(tf.expand_dims(frame, axis=0))['output_0'][0, 0],
+            input_tensor,
+            fn_output_signature=tf.float32
+        ).numpy()
+    
+    def _detect_array_with_tf(self, image: np.ndarray, stream: bool = False) -> np.ndarray:
+        """
+        Detect pose keypoints using TensorFlow MoveNet.
+        
+        Args:
+            image: Preprocessed image as numpy array
+            stream: Frame is part of a realtime stream (selects the MediaPipe fallback)
             
-            return formatted_keypoints
+        Returns:
+            (17,) KP_DTYPE keypoint array
+        """
+        try:
+            # Hand the frame to the inference thread and wait for its keypoints
+            return self._movenet_to_keypoints(self._infer.run(image))
             
         except Exception as e:
             logger.error(f"Error in TensorFlow pose detection: {str(e)}")
             # Fall back to MediaPipe or dummy keypoints
             if hasattr(self, 'pose'):
-                return self.detect_pose_with_mediapipe(image)
+                return self._detect_array_with_mediapipe(image, stream)
             else:
-                return self._get_dummy_keypoints()
+                return _DUMMY_KEYPOINTS
     
-    def detect_pose_with_mediapipe(self, image: np.ndarray) -> List[Dict[str, Any]]:
+    def detect_pose_with_tf(self, image: np.ndarray) -> List[Dict[str, Any]]:
         """
-        Detect pose keypoints using MediaPipe as fallback.
+        Detect pose keypoints using TensorFlow MoveNet.
         
         Args:
             image: Preprocessed image as numpy array
@@ -190,58 +868,100 @@ class YogaPoseEstimator:
         Returns:
             List of keypoint dictionaries
         """
+        return _as_dict_list(self._detect_array_with_tf(image))
+    
+    def detect_pose_with_tf_batch(self, images: List[np.ndarray]) -> List[List[Dict[str, Any]]]:
+        """
+        Detect pose keypoints for several frames with a single MoveNet dispatch.
+        
+        Args:
+            images: Preprocessed images as numpy arrays
+            
+        Returns:
+            List of keypoint lists, one per input image
+        """
+        if not images:
+            return []
+        
         try:
-            # Process the image with MediaPipe Pose
-            results = self.pose.process(image)
-            
-            if not results.pose_landmarks:
-                logger.warning("No pose landmarks detected with MediaPipe")
-                return self._get_dummy_keypoints()
-            
-            # Format keypoints from MediaPipe format to our format
-            formatted_keypoints = []
-            
-            # MediaPipe pose landmarks to our keypoint parts mapping
-            landmark_to_part = {
-                0: 'nose',
-                2: 'left_eye',
-                5: 'right_eye',
-                7: 'left_ear',
-                8: 'right_ear',
-                11: 'left_shoulder',
-                12: 'right_shoulder',
-                13: 'left_elbow',
-                14: 'right_elbow',
-                15: 'left_wrist',
-                16: 'right_wrist',
-                23: 'left_hip',
-                24: 'right_hip',
-                25: 'left_knee',
-                26: 'right_knee',
-                27: 'left_ankle',
-                28: 'right_ankle'
-            }
+            # Queue every frame at once so the inference thread batches them together
+            futures = [self._infer.submit(image) for image in images]
+            return [_as_dict_list(self._movenet_to_keypoints(future.result())) for future in futures]
             
-            for idx, part_name in landmark_to_part.items():
-                landmark = results.pose_landmarks.landmark[idx]
-                formatted_keypoints.append({
-                    'part': part_name,
-                    'position': {
-                        'x': landmark.x,  # MediaPipe already normalizes to 0-1
-                        'y': landmark.y   # MediaPipe already normalizes to 0-1
-                    },
-                    'score': landmark.visibility  # MediaPipe provides visibility as confidence
-                })
+        except Exception as e:
+            logger.error(f"Error in batched TensorFlow pose detection: {str(e)}")
+            # Fall back to per-frame detection
+            return [self.detect_pose_with_tf(image) for image in images]
+    
+    def _detect_array_with_mediapipe(self, image: np.ndarray, stream: bool = False) -> np.ndarray:
+        """
+        Detect pose keypoints using MediaPipe as fallback.
+        
+        Args:
+            image: Preprocessed image as numpy array
+            stream: Use the realtime tracking instance instead of the accurate one-shot one
             
-            return formatted_keypoints
+        Returns:
+            (17,) KP_DTYPE keypoint array
+        """
+        try:
+            # Shrink large frames first; landmarks are normalized so no rescale is needed after
+            height, width = image.shape[:2]
+            if max(height, width) > self._MEDIAPIPE_MAX_SIDE:
+                scale = self._MEDIAPIPE_MAX_SIDE / max(height, width)
+                image = cv2.resize(image, (round(width * scale), round(height * scale)),
+                                   interpolation=cv2.INTER_AREA)
+            # MediaPipe wraps C-contiguous uint8 frames without copying (no-op if already so)
+            image = np.ascontiguousarray(image, dtype=np.uint8)
+            
+            if stream and self._landmarker is not None:
+                # Tasks API landmarker on its configured delegate
+                landmarks = self._detect_landmarks_with_task(image)
+            else:
+                # Process the image with MediaPipe Pose
+                pose, lock = (self._stream_pose, self._stream_pose_lock) if stream else (self.pose, self._pose_lock)
+                with lock:
+                    results = pose.process(image)
+                landmarks = results.pose_landmarks.landmark if results.pose_landmarks else None
+            
+            if landmarks is None:
+                current_time = time.time()
+                if current_time - self._last_error_time > 5:  # Rate limit per-frame warnings
+                    logger.warning("No pose landmarks detected with MediaPipe")
+                    self._last_error_time = current_time
+                return _DUMMY_KEYPOINTS
+            
+            # Write keypoints from MediaPipe format straight into our keypoint array
+            keypoints = np.empty(len(KEYPOINT_NAMES), dtype=KP_DTYPE)
+            for i, landmark_id in enumerate(_LANDMARK_IDS):
+                landmark = landmarks[landmark_id]
+                # MediaPipe already normalizes x, y to 0-1 and provides visibility as confidence
+                keypoints[i] = (landmark.x, landmark.y, landmark.visibility)
+            
+            return keypoints
             
         except Exception as e:
             logger.error(f"Error in MediaPipe pose detection: {str(e)}")
-            return self._get_dummy_keypoints()
+            return _DUMMY_KEYPOINTS
     
-    def detect_pose(self, image: np.ndarray) -> List[Dict[str, Any]]:
+    def _detect_landmarks_with_task(self, image: np.ndarray):
         """
-        Detect pose keypoints using the best available model.
+        Run the MediaPipe Tasks pose landmarker on a realtime frame.
+        
+        Args:
+            image: C-contiguous RGB uint8 image as numpy array
+            
+        Returns:
+            Landmarks of the first detected pose, or None if no pose was found
+        """
+        with self._stream_pose_lock:
+            # VIDEO mode requires strictly increasing timestamps
+            self._landmarker_ts = max(self._landmarker_ts + 1, int(time.monotonic() * 1000))
+            return detect_pose_landmarks(self._landmarker, image, self._landmarker_ts)
+    
+    def detect_pose_with_mediapipe(self, image: np.ndarray) -> List[Dict[str, Any]]:
+        """
+        Detect pose keypoints using MediaPipe as fallback.
         
         Args:
             image: Preprocessed image as numpy array
@@ -249,18 +969,43 @@ class YogaPoseEstimator:
         Returns:
             List of keypoint dictionaries
         """
+        return _as_dict_list(self._detect_array_with_mediapipe(image))
+    
+    def detect_pose_array(self, image: np.ndarray, stream: bool = False) -> np.ndarray:
+        """
+        Detect pose keypoints using the best available model.
+        
+        Args:
+            image: Preprocessed image as numpy array
+            stream: Frame is part of a realtime stream (MediaPipe tracks between frames)
+            
+        Returns:
+            (17,) KP_DTYPE keypoint array in KEYPOINT_NAMES order
+        """
         # Use TensorFlow if available, otherwise MediaPipe
         if self.tf_model_loaded:
-            return self.detect_pose_with_tf(image)
+            return self._detect_array_with_tf(image, stream)
         else:
-            return self.detect_pose_with_mediapipe(image)
+            return self._detect_array_with_mediapipe(image, stream)
+    
+    def detect_pose(self, image: np.ndarray) -> List[Dict[str, Any]]:
+        """
+        Detect pose keypoints using the best available model.
+        
+        Args:
+            image: Preprocessed image as numpy array
+            
+        Returns:
+            List of keypoint dictionaries
+        """
+        return _as_dict_list(self.detect_pose_array(image))
 
-    def classify_pose(self, keypoints: List[Dict[str, Any]], pose_id: str) -> float:
+    def classify_pose(self, keypoints, pose_id: str) -> float:
         """
         Classify detected pose against expected pose.
         
         Args:
-            keypoints: Detected keypoints
+            keypoints: Detected keypoints (list of dictionaries or KP_DTYPE array)
             pose_id: Expected pose ID
             
         Returns:
@@ -268,26 +1013,14 @@ class YogaPoseEstimator:
         """
         if not self.classifier_loaded:
             # If no classifier, use keypoint-based matching
-            reference_keypoints = self.get_reference_pose(pose_id)['keypoints']
-            return self.evaluate_pose(keypoints, reference_keypoints)
+            return self.evaluate_pose(keypoints, self._get_reference_array(pose_id), self._get_pose_info(pose_id).get('trimester'))
         
         try:
             # Convert keypoints to feature vector
             features = self._keypoints_to_features(keypoints)
             
             # Get expected class index from pose_id
-            class_mapping = {
-                '1-1': 0,  # Mountain pose
-                '1-2': 1,  # Cat-Cow
-                '1-3': 2,  # Seated side stretch
-                '2-1': 3,  # Warrior II
-                '2-2': 4,  # Wide-legged forward fold
-                '2-3': 5,  # Triangle pose
-                '3-1': 6,  # Modified squat
-                '3-2': 7,  # Seated butterfly
-                '3-3': 8   # Side-lying relaxation
-            }
-            expected_class = class_mapping.get(pose_id, 0)
+            expected_class = _POSE_CLASS_INDEX.get(pose_id, 0)
             
             # Run inference
             input_tensor = tf.convert_to_tensor([features], dtype=tf.float32)
@@ -300,7 +1033,7 @@ class YogaPoseEstimator:
             top_class = np.argmax(predictions[0])
             top_score = predictions[0][top_class] * 100
             
-            logger.info(f"Pose classification: expected={expected_class}, top={top_class}, score={top_score:.2f}%")
+            logger.info("Pose classification: expected=%s, top=%s, score=%.2f%%", expected_class, top_class, top_score)
             
             # If top prediction matches expected pose, use that score
             # Otherwise, use the score for the expected pose
@@ -308,101 +1041,49 @@ class YogaPoseEstimator:
                 return float(top_score)
             else:
                 # Mix scores: 70% from keypoint comparison, 30% from classifier
-                keypoint_score = self.evaluate_pose(keypoints, self.get_reference_pose(pose_id)['keypoints'])
+                keypoint_score = self.evaluate_pose(keypoints, self._get_reference_array(pose_id), self._get_pose_info(pose_id).get('trimester'))
                 return 0.7 * keypoint_score + 0.3 * float(class_score)
             
         except Exception as e:
             logger.error(f"Error in pose classification: {str(e)}")
             # Fall back to keypoint-based matching
-            reference_keypoints = self.get_reference_pose(pose_id)['keypoints']
-            return self.evaluate_pose(keypoints, reference_keypoints)
+            return self.evaluate_pose(keypoints, self._get_reference_array(pose_id), self._get_pose_info(pose_id).get('trimester'))
     
-    def _keypoints_to_features(self, keypoints: List[Dict[str, Any]]) -> List[float]:
+    def _keypoints_to_features(self, keypoints) -> List[float]:
         """
         Convert keypoints to feature vector for classification.
         
         Args:
-            keypoints: List of keypoint dictionaries
+            keypoints: List of keypoint dictionaries or KP_DTYPE array
             
         Returns:
             Flat array of features
         """
-        # Create dictionary for lookup
-        keypoint_dict = {kp['part']: kp for kp in keypoints}
-        
-        # Define keypoint pairs for angle calculation
-        angle_pairs = [
-            # Head/Neck
-            ('nose', 'left_shoulder', 'right_shoulder'),
-            # Shoulders
-            ('left_elbow', 'left_shoulder', 'left_hip'),
-            ('right_elbow', 'right_shoulder', 'right_hip'),
-            # Elbows
-            ('left_wrist', 'left_elbow', 'left_shoulder'),
-            ('right_wrist', 'right_elbow', 'right_shoulder'),
-            # Hips
-            ('left_shoulder', 'left_hip', 'left_knee'),
-            ('right_shoulder', 'right_hip', 'right_knee'),
-            # Knees
-            ('left_hip', 'left_knee', 'left_ankle'),
-            ('right_hip', 'right_knee', 'right_ankle'),
-        ]
-        
-        # Feature vector: x, y coordinates for each keypoint + angles
-        features = []
-        
-        # Add normalized coordinates for each keypoint
-        for part in [
-            'nose', 'left_eye', 'right_eye', 'left_ear', 'right_ear',
-            'left_shoulder', 'right_shoulder', 'left_elbow', 'right_elbow',
-            'left_wrist', 'right_wrist', 'left_hip', 'right_hip',
-            'left_knee', 'right_knee', 'left_ankle', 'right_ankle'
-        ]:
-            if part in keypoint_dict and keypoint_dict[part]['score'] > 0.1:
-                features.append(keypoint_dict[part]['position']['x'])
-                features.append(keypoint_dict[part]['position']['y'])
-            else:
-                features.append(0.0)
-                features.append(0.0)
-        
-        # Add angles
-        for a, b, c in angle_pairs:
-            if all(part in keypoint_dict and keypoint_dict[part]['score'] > 0.1 for part in [a, b, c]):
-                angle = self._calculate_angle(
-                    keypoint_dict[a]['position'],
-                    keypoint_dict[b]['position'],
-                    keypoint_dict[c]['position']
-                )
-                # Normalize angle to [0,1]
-                features.append(angle / 180.0)
-            else:
-                features.append(0.0)
+        # Gather confident keypoints into one (17, 2) array; others stay at zero
+        if isinstance(keypoints, np.ndarray):
+            confident = keypoints['score'] > 0.1
+            positions = np.where(confident[:, None], _kp_positions(keypoints), 0.0)
+        else:
+            positions = np.zeros((len(KEYPOINT_NAMES), 2))
+            confident = np.zeros(len(KEYPOINT_NAMES), dtype=bool)
+            for kp in keypoints:
+                idx = _KP_INDEX.get(kp['part'])
+                if idx is not None:
+                    confident[idx] = kp['score'] > 0.1
+                    positions[idx] = (kp['position']['x'], kp['position']['y']) if confident[idx] else (0.0, 0.0)
         
-        # Add relative distances between key joints
-        dist_pairs = [
-            ('left_shoulder', 'right_shoulder'),  # Shoulder width
-            ('left_hip', 'right_hip'),            # Hip width
-            ('left_shoulder', 'left_hip'),        # Torso height left
-            ('right_shoulder', 'right_hip'),      # Torso height right
-            ('left_knee', 'left_ankle'),          # Lower leg left
-            ('right_knee', 'right_ankle'),        # Lower leg right
-            ('left_hip', 'left_knee'),            # Upper leg left
-            ('right_hip', 'right_knee'),          # Upper leg right
-            ('left_elbow', 'left_wrist'),         # Lower arm left
-            ('right_elbow', 'right_wrist')        # Lower arm right
-        ]
+        # Angles at each vertex, normalized to [0, 1]
+        angles = _joint_angles(positions, self._FEATURE_ANGLE_IDX) / 180.0
+        angles = np.where(confident[self._FEATURE_ANGLE_IDX].all(axis=1), angles, 0.0)
         
-        for a, b in dist_pairs:
-            if all(part in keypoint_dict and keypoint_dict[part]['score'] > 0.1 for part in [a, b]):
-                dist = self._calculate_distance(
-                    keypoint_dict[a]['position'],
-                    keypoint_dict[b]['position']
-                )
-                features.append(dist)
-            else:
-                features.append(0.0)
+        # Relative distances between key joints
+        distances = np.linalg.norm(
+            positions[self._FEATURE_DIST_IDX[:, 0]] - positions[self._FEATURE_DIST_IDX[:, 1]], axis=1
+        )
+        distances = np.where(confident[self._FEATURE_DIST_IDX].all(axis=1), distances, 0.0)
         
-        return features
+        # Feature vector: x, y coordinates for each keypoint + angles + distances
+        return np.concatenate([positions.ravel(), angles, distances]).tolist()
     
     def _calculate_angle(self, a: Dict[str, float], b: Dict[str, float], c: Dict[str, float]) -> float:
         """
@@ -442,151 +1123,84 @@ class YogaPoseEstimator:
         Returns:
             Distance
         """
-        return float(np.sqrt((a['x'] - b['x'])**2 + (a['y'] - b['y'])**2))
+        return math.hypot(a['x'] - b['x'], a['y'] - b['y'])
     
     def _get_dummy_keypoints(self) -> List[Dict[str, Any]]:
-        """Generate dummy keypoints for testing when no model is available."""
-        # Standard pose in mountain pose (simplified)
-        keypoint_names = [
-            'nose', 'left_eye', 'right_eye', 'left_ear', 'right_ear',
-            'left_shoulder', 'right_shoulder', 'left_elbow', 'right_elbow',
-            'left_wrist', 'right_wrist', 'left_hip', 'right_hip',
-            'left_knee', 'right_knee', 'left_ankle', 'right_ankle'
-        ]
+        """Get dummy keypoints for testing when no model is available (shared list, do not modify)."""
+        return _DUMMY_KEYPOINT_DICTS
+    
+    def _keypoints_to_array(self, keypoints) -> np.ndarray:
+        """
+        Convert keypoints to a (17, 2) array of x, y positions.
         
-        # Fixed dummy positions (simplified mountain pose)
-        positions = [
-            (0.5, 0.1),  # nose
-            (0.45, 0.09),  # left_eye
-            (0.55, 0.09),  # right_eye
-            (0.4, 0.1),  # left_ear
-            (0.6, 0.1),  # right_ear
-            (0.4, 0.25),  # left_shoulder
-            (0.6, 0.25),  # right_shoulder
-            (0.35, 0.4),  # left_elbow
-            (0.65, 0.4),  # right_elbow
-            (0.3, 0.55),  # left_wrist
-            (0.7, 0.55),  # right_wrist
-            (0.45, 0.55),  # left_hip
-            (0.55, 0.55),  # right_hip
-            (0.45, 0.75),  # left_knee
-            (0.55, 0.75),  # right_knee
-            (0.45, 0.95),  # left_ankle
-            (0.55, 0.95)   # right_ankle
-        ]
+        Args:
+            keypoints: List of keypoint dictionaries, KP_DTYPE array or (17, 2) positions
+            
+        Returns:
+            Positions in KEYPOINT_NAMES order, NaN for missing parts
+        """
+        if isinstance(keypoints, np.ndarray):
+            return _kp_positions(keypoints) if keypoints.dtype == KP_DTYPE else keypoints
+        
+        positions = np.full((len(KEYPOINT_NAMES), 2), np.nan)
         
-        # Create keypoint list
-        formatted_keypoints = []
-        for i, (name, pos) in enumerate(zip(keypoint_names, positions)):
-            formatted_keypoints.append({
-                'part': name,
-                'position': {
-                    'x': pos[0],
-                    'y': pos[1]
-                },
-                'score': 0.9  # High confidence for dummy data
-            })
-        
-        return formatted_keypoints
+        # Gather in plain Python, then write every row with one fancy-indexed assignment
+        indices = []
+        coords = []
+        for kp in keypoints:
+            idx = _KP_INDEX.get(kp['part'])
+            if idx is not None:
+                position = kp['position']
+                indices.append(idx)
+                coords.append((position['x'], position['y']))
+        if indices:
+            positions[indices] = coords
+        return positions
     
-    def evaluate_pose(self, detected_keypoints: List[Dict[str, Any]], reference_keypoints: List[Dict[str, Any]]) -> float:
+    def _get_reference_array(self, pose_id: str) -> np.ndarray:
+        """Get the read-only (17, 2) reference positions of a pose, defaulting to Mountain Pose."""
+        return _REFERENCE_POSES.get(pose_id, _REFERENCE_POSES['1-1'])
+    
+    def evaluate_pose(self, detected_keypoints, reference_keypoints, trimester: str = None) -> float:
         """
         Evaluate pose accuracy by comparing detected keypoints to reference keypoints.
         
         Args:
-            detected_keypoints: List of keypoints detected from user image
-            reference_keypoints: List of keypoints from reference pose
+            detected_keypoints: Keypoints detected from user image (list, KP_DTYPE array or (17, 2) array)
+            reference_keypoints: Keypoints from reference pose (list, KP_DTYPE array or (17, 2) array)
+            trimester: Pregnancy trimester selecting the position tolerances (default 'second')
             
         Returns:
             Accuracy score (0-100)
         """
-        if not detected_keypoints or not reference_keypoints:
+        if detected_keypoints is None or reference_keypoints is None:
+            return 0.0
+        if len(detected_keypoints) == 0 or len(reference_keypoints) == 0:
             return 0.0
         
         try:
-            # Create dictionaries for quick lookup
-            detected_dict = {kp['part']: kp for kp in detected_keypoints}
-            reference_dict = {kp['part']: kp for kp in reference_keypoints}
-            
-            # Calculate accuracy for each matching keypoint
-            total_score = 0.0
-            count = 0
-            
-            # Define important keypoints with weights
-            keypoint_weights = {
-                'left_shoulder': 1.5,
-                'right_shoulder': 1.5,
-                'left_hip': 1.5,
-                'right_hip': 1.5,
-                'left_knee': 1.2,
-                'right_knee': 1.2,
-                'left_ankle': 1.0,
-                'right_ankle': 1.0,
-                'left_elbow': 1.0,
-                'right_elbow': 1.0,
-                'left_wrist': 0.8,
-                'right_wrist': 0.8
-            }
-            
-            total_weight = 0.0
-            
-            # Evaluate joint positions
-            for part, weight in keypoint_weights.items():
-                if part in detected_dict and part in reference_dict:
-                    # Get positions
-                    detected_pos = detected_dict[part]['position']
-                    reference_pos = reference_dict[part]['position']
-                    
-                    # Calculate Euclidean distance (normalized)
-                    distance = ((detected_pos['x'] - reference_pos['x']) ** 2 + 
-                                (detected_pos['y'] - reference_pos['y']) ** 2) ** 0.5
-                    
-                    # Convert distance to similarity score (1.0 means perfect match)
-                    # Max distance is √2 (across the diagonal of a 1x1 square)
-                    similarity = max(0, 1.0 - distance / 0.3)
-                    
-                    # Apply weight and add to total
-                    total_score += similarity * weight
-                    total_weight += weight
-                    count += 1
-            
-            # Calculate joint angles and evaluate them
-            angle_triplets = [
-                ('left_shoulder', 'left_elbow', 'left_wrist'),
-                ('right_shoulder', 'right_elbow', 'right_wrist'),
-                ('left_hip', 'left_knee', 'left_ankle'),
-                ('right_hip', 'right_knee', 'right_ankle'),
-                ('left_hip', 'left_shoulder', 'left_elbow'),
-                ('right_hip', 'right_shoulder', 'right_elbow')
-            ]
-            
-            for a, b, c in angle_triplets:
-                if all(part in detected_dict and part in reference_dict for part in [a, b, c]):
-                    # Calculate angles
-                    detected_angle = self._calculate_angle(
-                        detected_dict[a]['position'],
-                        detected_dict[b]['position'],
-                        detected_dict[c]['position']
-                    )
-                    
-                    reference_angle = self._calculate_angle(
-                        reference_dict[a]['position'],
-                        reference_dict[b]['position'],
-                        reference_dict[c]['position']
-                    )
-                    
-                    # Calculate angular difference
-                    angle_diff = abs(detected_angle - reference_angle)
-                    # Convert to similarity (0-1)
-                    angle_similarity = max(0, 1.0 - angle_diff / 90.0)
-                    
-                    # Add to total score with weight 1.0
-                    total_score += angle_similarity * 1.0
-                    total_weight += 1.0
-                    count += 1
+            detected = self._keypoints_to_array(detected_keypoints)
+            reference = self._keypoints_to_array(reference_keypoints)
+            
+            # Compare pelvis-centered, shoulder-scaled poses when both can be aligned,
+            # otherwise fall back to raw image coordinates
+            if trimester not in self._TOLERANCES:
+                trimester = 'second'
+            tolerances = self._TOLERANCES[trimester]
+            aligned_detected = _align_pose(detected)
+            aligned_reference = _align_pose(reference)
+            if aligned_detected is not None and aligned_reference is not None:
+                detected, reference = aligned_detected, aligned_reference
+                tolerances = self._ALIGNED_TOLERANCES[trimester]
+            
+            # Weighted position and joint-angle similarity (1.0 means perfect match);
+            # parts missing from either pose are skipped
+            total_score, total_weight = _pose_score(
+                detected, reference, self._WEIGHT_IDX, self._WEIGHTS, tolerances, self._ANGLE_TRIPLETS
+            )
             
             # Calculate overall accuracy
-            if count > 0 and total_weight > 0:
+            if total_weight > 0:
                 accuracy = (total_score / total_weight) * 100
                 return max(0, min(100, accuracy))
             else:
@@ -599,7 +1213,7 @@ class YogaPoseEstimator:
     def get_reference_pose(self, pose_id: str) -> Dict[str, Any]:
         """
         Get reference pose keypoints for a specific yoga pose.
-        Uses cached data, hardcoded poses, or generates with LLM.
+        Uses cached data, the shipped reference table, or generates with LLM.
         
         Args:
             pose_id: Identifier for the yoga pose
@@ -607,21 +1221,20 @@ class YogaPoseEstimator:
         Returns:
             Dictionary with reference keypoints and metadata
         """
-        # Check if we have this pose cached
-        if pose_id in self._reference_poses:
-            return self._reference_poses[pose_id]
-        
+        return self._reference_pose_cache(pose_id)
+    
+    def _build_reference_pose(self, pose_id: str) -> Dict[str, Any]:
+        """Build the reference pose dictionary for get_reference_pose's cache."""
         # Get pose information from predefined data
         pose_info = self._get_pose_info(pose_id)
         
         if not pose_info:
             logger.warning(f"No pose info found for ID: {pose_id}")
             # Return default reference pose
-            self._reference_poses[pose_id] = {
+            return {
                 'id': pose_id,
                 'keypoints': self._get_pose_specific_keypoints(pose_id)
             }
-            return self._reference_poses[pose_id]
         
         # Get keypoints for this pose
         keypoints = self._get_pose_specific_keypoints(pose_id)
@@ -639,213 +1252,46 @@ class YogaPoseEstimator:
             except Exception as e:
                 logger.error(f"Failed to enhance keypoints with LLM: {e}")
         
-        # Cache the reference pose
-        self._reference_poses[pose_id] = {
+        return {
             'id': pose_id,
             'title': pose_info.get('title', 'Unknown Pose'),
             'keypoints': keypoints
         }
-        
-        return self._reference_poses[pose_id]
     
     def _get_pose_info(self, pose_id: str) -> Dict[str, Any]:
         """Get pose information for a given pose ID."""
-        # Sample pose information for common yoga poses
-        poses = {
-            '1-1': {
-                'title': 'Modified Mountain Pose',
-                'description': 'Stand tall with feet hip-width apart, arms at sides. Draw shoulders back and down, engage core gently.'
-            },
-            '1-2': {
-                'title': 'Cat-Cow Stretch',
-                'description': 'Start on hands and knees. Alternate between arching back (cow) and rounding spine (cat).'
-            },
-            '1-3': {
-                'title': 'Seated Side Stretch',
-                'description': 'Sit cross-legged, reach one arm overhead and lean to opposite side. Hold and repeat on other side.'
-            },
-            '2-1': {
-                'title': 'Warrior II',
-                'description': 'Step feet wide apart, turn one foot out. Bend knee over ankle, extend arms and gaze over front hand.'
-            },
-            '2-2': {
-                'title': 'Wide-Legged Forward Fold',
-                'description': 'Step feet wide apart, fold forward from hips. Rest hands on floor or blocks if needed.'
-            },
-            '2-3': {
-                'title': 'Supported Triangle Pose',
-                'description': 'Step feet wide apart, extend one arm down to shin/block/floor and the other arm up.'
-            },
-            '3-1': {
-                'title': 'Modified Squat',
-                'description': 'Stand with feet wider than hips, lower into squat. Use wall or chair for support if needed.'
-            },
-            '3-2': {
-                'title': 'Seated Butterfly',
-                'description': 'Sit with soles of feet together, knees out to sides. Sit on blanket for support if needed.'
-            },
-            '3-3': {
-                'title': 'Side-Lying Relaxation',
-                'description': 'Lie on left side with pillows supporting head, belly, and between knees.'
-            }
-        }
-        
-        return poses.get(pose_id, {})
+        return _POSE_INFO.get(pose_id, {})
     
-    # Functions to get reference keypoints for different poses - these are from the original code
     def _get_pose_specific_keypoints(self, pose_id: str) -> List[Dict[str, Any]]:
-        """Get specific keypoints for a pose ID as fallback."""
-        pose_keypoints_map = {
-            '1-1': self._generate_mountain_pose_keypoints(),
-            '1-2': self._generate_cat_cow_pose_keypoints(),
-            '1-3': self._generate_seated_side_stretch_keypoints(),
-            '2-1': self._generate_warrior_ii_keypoints(),
-            '2-2': self._generate_wide_legged_forward_fold_keypoints(),
-            '2-3': self._generate_triangle_pose_keypoints(),
-            '3-1': self._generate_squat_pose_keypoints(),
-            '3-2': self._generate_butterfly_pose_keypoints(),
-            '3-3': self._generate_side_lying_pose_keypoints()
-        }
-        
-        return pose_keypoints_map.get(pose_id, self._generate_mountain_pose_keypoints())
-    
-    # The generate_*_keypoints methods remain the same as in the original code
-    # Just keeping one as example
-    def _generate_mountain_pose_keypoints(self) -> List[Dict[str, Any]]:
-        """Generate keypoints for Mountain Pose."""
-        return [
-            {'part': 'nose', 'position': {'x': 0.5, 'y': 0.1}, 'score': 1.0},
-            {'part': 'left_eye', 'position': {'x': 0.47, 'y': 0.09}, 'score': 1.0},
-            {'part': 'right_eye', 'position': {'x': 0.53, 'y': 0.09}, 'score': 1.0},
-            {'part': 'left_ear', 'position': {'x': 0.44, 'y': 0.1}, 'score': 1.0},
-            {'part': 'right_ear', 'position': {'x': 0.56, 'y': 0.1}, 'score': 1.0},
-            {'part': 'left_shoulder', 'position': {'x': 0.42, 'y': 0.22}, 'score': 1.0},
-            {'part': 'right_shoulder', 'position': {'x': 0.58, 'y': 0.22}, 'score': 1.0},
-            {'part': 'left_elbow', 'position': {'x': 0.4, 'y': 0.38}, 'score': 1.0},
-            {'part': 'right_elbow', 'position': {'x': 0.6, 'y': 0.38}, 'score': 1.0},
-            {'part': 'left_wrist', 'position': {'x': 0.38, 'y': 0.52}, 'score': 1.0},
-            {'part': 'right_wrist', 'position': {'x': 0.62, 'y': 0.52}, 'score': 1.0},
-            {'part': 'left_hip', 'position': {'x': 0.46, 'y': 0.54}, 'score': 1.0},
-            {'part': 'right_hip', 'position': {'x': 0.54, 'y': 0.54}, 'score': 1.0},
-            {'part': 'left_knee', 'position': {'x': 0.46, 'y': 0.74}, 'score': 1.0},
-            {'part': 'right_knee', 'position': {'x': 0.54, 'y': 0.74}, 'score': 1.0},
-            {'part': 'left_ankle', 'position': {'x': 0.46, 'y': 0.94}, 'score': 1.0},
-            {'part': 'right_ankle', 'position': {'x': 0.54, 'y': 0.94}, 'score': 1.0}
-        ]
-    
-    # ... (other _generate_*_keypoints methods from the original code)
+        """Get specific keypoints for a pose ID, defaulting to Mountain Pose (shared, do not modify)."""
+        return _REFERENCE_KPS.get(pose_id, _REFERENCE_KPS['1-1'])
     
     def get_pose_feedback(self, image_data: bytes, pose_id: str, detected_keypoints: List[Dict[str, Any]], is_final: bool = False) -> str:
-        """Get LLM-based feedback on the user's pose using Groq API."""
+        """
+        Get LLM-based feedback on the user's pose using Groq API.
+        Identical requests that arrive while one is in flight share its Groq call.
+        """
+        return self._inflight_feedback.do(
+            (pose_id, is_final, image_data),
+            self._request_pose_feedback, image_data, pose_id, detected_keypoints, is_final
+        )
+    
+    def _request_pose_feedback(self, image_data: bytes, pose_id: str, detected_keypoints: List[Dict[str, Any]], is_final: bool) -> str:
+        """Compute pose feedback, calling Groq and falling back to rule-based feedback."""
+        pose_name = POSE_NAMES.get(pose_id, 'Yoga Pose')
         try:
-            # If no keypoints provided, detect them first
-            if not detected_keypoints or len(detected_keypoints) < 5:
-                preprocessed_image = self.preprocess_image(image_data)
-                detected_keypoints = self.detect_pose(preprocessed_image)
-            
-            # Get reference pose
-            reference_pose = self.get_reference_pose(pose_id)
-            reference_keypoints = reference_pose['keypoints']
-            
-            # Calculate accuracy
-            accuracy = self.evaluate_pose(detected_keypoints, reference_keypoints)
-            
-            # Convert image to base64 if it's bytes
-            if isinstance(image_data, bytes):
-                base64_image = base64.b64encode(image_data).decode('utf-8')
-            else:
-                base64_image = image_data
-                
-            # Determine pose name based on ID
-            pose_names = {
-                '1-1': 'Modified Mountain Pose',
-                '1-2': 'Cat-Cow Stretch',
-                '1-3': 'Seated Side Stretch',
-                '2-1': 'Warrior II',
-                '2-2': 'Wide-Legged Forward Fold',
-                '2-3': 'Supported Triangle Pose',
-                '3-1': 'Modified Squat',
-                '3-2': 'Seated Butterfly',
-                '3-3': 'Side-Lying Relaxation'
-            }
-            
-            pose_name = pose_names.get(pose_id, 'Yoga Pose')
-            
-            # Pregnancy safety instructions to include
-            pregnancy_safety = """
-            Remember that this is a pregnant woman, so feedback must prioritize safety. 
-            Caution against:
-            - Deep twists that compress the abdomen
-            - Poses that put pressure on the belly
-            - Holding breath
-            - Overstretching (due to relaxin hormone)
-            - Lying flat on back after first trimester
-            
-            Encourage:
-            - Modified poses with props if needed
-            - Widening stance for balance
-            - Listening to the body and backing off if uncomfortable
-            """
-            
-            # Add information about detected issues
-            detected_issues = self._analyze_pose_issues(detected_keypoints, reference_keypoints, pose_id)
-            issues_text = ""
-            if detected_issues:
-                issues_text = "Detected alignment issues:\n" + "\n".join([f"- {issue}" for issue in detected_issues])
-            
-            # Create a structured prompt for pose feedback
-            combined_prompt = f"""
-            You are a specialized prenatal yoga instructor providing feedback to a pregnant woman. 
-            
-            TASK: Analyze the yoga pose image and provide helpful guidance on proper alignment and technique for the {pose_name}.
-            
-            Current accuracy score: {accuracy:.1f}% 
-            
-            {issues_text}
-            
-            {pregnancy_safety}
-            
-            For this specific pose ({pose_name}), provide:
-            1. Brief 1-2 sentence assessment of overall alignment
-            2. 2-3 specific, actionable cues to improve the pose
-            3. One encouraging statement
-            
-            Your feedback should be clear, supportive, and focused on safety for pregnancy.
-            
-            {"This is their final feedback for this practice session, so include overall summary comments." if is_final else ""}
-            
-            Keep your response under 150 words.
-            """
+            request, accuracy, detected_issues = self._build_feedback_request(image_data, pose_id, detected_keypoints, is_final)
+            if request is None:
+                return random.choice(_GOOD_POSE_PHRASES).format(pose_name=pose_name)
             
             # Call Groq API
-            response = requests.post(
-                GROQ_API_ENDPOINT,
-                headers={
-                    "Content-Type": "application/json",
-                    "Authorization": f"Bearer {GROQ_API_KEY}"
-                },
-                json={
-                    "model": "llama-3.2-11b-vision-preview",  # Current supported Groq model
-                    "messages": [
-                        {
-                            "role": "user",
-                            "content": [
-                                {"type": "text", "text": combined_prompt},
-                                {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}}
-                            ]
-                        }
-                    ],
-                    "temperature": 0.2,
-                    "max_tokens": 1024
-                }
-            )
+            response = post_chat_completion(self._http, _json_dumps(request))
             
-            # Parse the response
+            # Parse the response straight from the raw body bytes
             if response.status_code == 200:
-                result = response.json()
+                result = _json_loads(response.content)
                 # Extract content from Groq's response structure
-                content = result['choices'][0]['message']['content']
-                return content
+                return result['choices'][0]['message']['content']
             else:
                 logger.error(f"Groq API Error: {response.status_code} - {response.text}")
                 return self._generate_fallback_feedback(accuracy, detected_issues, pose_name, is_final)
@@ -854,6 +1300,63 @@ class YogaPoseEstimator:
             logger.exception(f"Error getting pose feedback: {str(e)}")
             return self._generate_fallback_feedback(50.0, [], pose_name, is_final)
     
+    def _build_feedback_request(self, image_data: bytes, pose_id: str, detected_keypoints: List[Dict[str, Any]], is_final: bool) -> Tuple[Optional[Dict[str, Any]], float, List[str]]:
+        """
+        Build the Groq feedback request for a frame.
+        
+        Returns:
+            Tuple of (request body, pose accuracy, detected issues); the request body
+            is None when the pose is good enough that Groq needn't be asked
+        """
+        pose_name = POSE_NAMES.get(pose_id, 'Yoga Pose')
+        
+        # If no keypoints provided, detect them first
+        if not detected_keypoints or len(detected_keypoints) < 5:
+            preprocessed_image = self.preprocess_image(image_data, reuse_buffer=True)
+            detected_keypoints = self.detect_pose(preprocessed_image)
+        
+        # Get reference pose
+        reference_pose = self.get_reference_pose(pose_id)
+        reference_keypoints = reference_pose['keypoints']
+        
+        # Calculate accuracy
+        accuracy = self.evaluate_pose(detected_keypoints, self._get_reference_array(pose_id), self._get_pose_info(pose_id).get('trimester'))
+        
+        # Good poses mid-session only need encouragement; final feedback always asks Groq
+        if accuracy >= self._GOOD_POSE_ACCURACY and not is_final:
+            return None, accuracy, []
+        
+        # Convert image to base64 if it's bytes
+        if isinstance(image_data, bytes):
+            base64_image = _encode_image_base64(image_data)
+        else:
+            base64_image = image_data
+        
+        # Add information about detected issues
+        detected_issues = self._analyze_pose_issues(detected_keypoints, reference_keypoints, pose_id)
+        issues_text = ""
+        if detected_issues:
+            issues_text = "Detected alignment issues:\n" + "\n".join([f"- {issue}" for issue in detected_issues])
+        
+        # Fill the precomputed prompt for this pose
+        templates = _PROMPT_BY_POSE_FINAL if is_final else _PROMPT_BY_POSE
+        template = templates.get(pose_id) or _build_feedback_prompt(pose_name, is_final)
+        combined_prompt = template.format(accuracy=accuracy, issues_text=issues_text)
+        
+        request = {
+            **_FEEDBACK_REQUEST,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "text", "text": combined_prompt},
+                        {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}}
+                    ]
+                }
+            ]
+        }
+        return request, accuracy, detected_issues
+    
     def _analyze_pose_issues(self, detected_keypoints: List[Dict[str, Any]], reference_keypoints: List[Dict[str, Any]], pose_id: str) -> List[str]:
         """
         Analyze specific issues with the detected pose compared to reference.
@@ -987,50 +1490,53 @@ class YogaPoseEstimator:
     
     def estimate_pose(self, image_data: bytes, pose_id: str) -> Dict[str, Any]:
         """Process image to detect pose, evaluate accuracy, and return results."""
+        reference_pose = None
         try:
-            # Decode base64 image if needed
-            if isinstance(image_data, str):
-                if ',' in image_data:
-                    image_data = image_data.split(',')[1]
-                image_bytes = base64.b64decode(image_data)
-            else:
-                image_bytes = image_data
-            
-            # Preprocess image
-            preprocessed_image = self.preprocess_image(image_bytes)
-            
-            # Detect pose keypoints
-            keypoints = self.detect_pose(preprocessed_image)
-            
-            # Get reference pose
+            # Get reference pose first so the error path can reuse it
             reference_pose = self.get_reference_pose(pose_id)
             reference_keypoints = reference_pose['keypoints']
             
+            # Decode base64 image if needed; binary uploads are used as-is
+            if isinstance(image_data, (bytes, bytearray, memoryview)):
+                image_bytes = image_data
+            else:
+                # Strip an optional data URL prefix without splitting the payload
+                header, sep, payload = image_data.partition(',')
+                image_bytes = _b64.b64decode(payload if sep else header)
+            
+            # Preprocess and detect pose keypoints
+            # (detection is done with the frame when it returns, so the decode buffer is reused)
+            keypoints = self.detect_pose_array(self.preprocess_image(image_bytes, reuse_buffer=True), stream=True)
+            
             # Evaluate pose accuracy - try classification first if available
             if self.classifier_loaded:
                 accuracy = self.classify_pose(keypoints, pose_id)
             else:
-                accuracy = self.evaluate_pose(keypoints, reference_keypoints)
+                accuracy = self.evaluate_pose(keypoints, self._get_reference_array(pose_id), self._get_pose_info(pose_id).get('trimester'))
             
             # Add small random variation to make it more dynamic
             accuracy = min(100, max(0, accuracy + (np.random.random() - 0.5) * 3))
             
-            # Return results
+            # Return results, converting keypoints to dictionaries only for the response
             return {
                 'pose_id': pose_id,
                 'accuracy': accuracy,
-                'keypoints': keypoints,
+                'keypoints': _as_dict_list(keypoints),
                 'reference_keypoints': reference_keypoints
             }
             
         except Exception as e:
-            logger.exception(f"Error estimating pose: {str(e)}")
+            current_time = time.time()
+            if current_time - self._last_error_time > 5:  # Rate limit error logs
+                logger.exception("Error estimating pose: %s", e)
+                self._last_error_time = current_time
             # Return fallback results
             return {
                 'pose_id': pose_id,
                 'accuracy': 50.0,  # Default medium accuracy
                 'keypoints': self._get_dummy_keypoints(),
-                'reference_keypoints': self.get_reference_pose(pose_id)['keypoints']
+                'reference_keypoints': reference_pose['keypoints'] if reference_pose
+                    else self._get_pose_specific_keypoints(pose_id)
             }
     
     def generate_reference_pose_with_llm(self, pose_id: str, pose_name: str, pose_description: str) -> list:
@@ -1055,5 +1561,24 @@ class YogaPoseEstimator:
         # This can be kept as fallback but is less important now with improved detection
         return []  # Return empty list as placeholder
 
-# Create a singleton instance
-yoga_pose_estimator = YogaPoseEstimator()
\ No newline at end of file
+# Singleton instance, created on first use so importing this module stays cheap
+# and each forked server worker loads its own models
+_instance: Optional[YogaPoseEstimator] = None
+_instance_lock = threading.Lock()
+
+
+def get_estimator() -> YogaPoseEstimator:
+    """Return the shared YogaPoseEstimator, creating it on first call."""
+    global _instance
+    if _instance is None:
+        with _instance_lock:
+            if _instance is None:
+                _instance = YogaPoseEstimator()
+    return _instance
+
+
+def __getattr__(name: str):
+    """Keep `from ai.yoga_pose_estimation import yoga_pose_estimator` working lazily."""
+    if name == 'yoga_pose_estimator':
+        return get_estimator()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -2,8 +2,10 @@
 from flask import Flask, request, jsonify, Response
 from flask_cors import CORS
 import os
-import uuid
+import hashlib
+import secrets
 import base64
+import binascii
 import logging
 import re  # Added for JSON extraction from LLM responses
 from werkzeug.utils import secure_filename
@@ -11,29 +13,58 @@ import json
 import time
 from dotenv import load_dotenv
 from groq import Groq
+from json_provider import OrjsonProvider, orjson
+
+# Load environment variables before the AI modules read them
+load_dotenv()
 
 # Import AI modules
+from ai.groq_client import GROQ_API_KEY, extract_json_object
 from ai.ocr import process_prescription_image, identify_medication
 from ai.chatbot import get_pregnancy_response
 from ai.fall_detection import analyze_accelerometer_data
 from ai.grok_vision import GroqVision
 import requests
-# from ai.yoga_pose_estimation import yoga_pose_estimator
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+# from ai.yoga_pose_estimation import get_estimator
 import base64
-# Load environment variables
-load_dotenv()
+
+# pybase64 is optional - base64 falls back to the stdlib codec without it
+try:
+    import pybase64 as _b64
+except ImportError:
+    _b64 = base64
 
 # Initialize Flask app
 app = Flask(__name__)
+if orjson is not None:
+    app.json = OrjsonProvider(app)
 CORS(app)  # Enable Cross-Origin Resource Sharing
 
 # Initialize Groq client
-groq_client = Groq(api_key=os.getenv("GROQ_API_KEY", "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"))
+groq_client = Groq(api_key=GROQ_API_KEY)
+
+# Pooled session for raw Groq HTTP calls, so requests reuse keep-alive TLS connections
+groq_http = requests.Session()
+groq_http.headers.update({
+    "Content-Type": "application/json",
+    "Authorization": f"Bearer {GROQ_API_KEY}"
+})
+groq_http.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=64,
+    max_retries=Retry(total=2, backoff_factor=0.1)
+))
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Precompiled patterns for pulling JSON out of LLM responses
+_JSON_CODE_BLOCK_RE = re.compile(r'```(?:json)?\s*([\s\S]*?)\s*```')
+_JSON_ARRAY_RE = re.compile(r'(\[[\s\S]*?\])')
+
 # Configure upload folder
 UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static/uploads')
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
@@ -72,6 +103,19 @@ medications_data = {
     }
 }
 
+# Case-insensitive index into medications_data: lowercased name -> (name, info)
+_MED_CI = {name.lower(): (name, info) for name, info in medications_data.items()}
+
+# ETag of each medication's (static) info, by lowercased name. Responses echo the
+# requested name, but caches key ETags by URL and the name is in the query string,
+# so each spelling is validated as its own resource
+_MED_ETAGS = {
+    name.lower(): hashlib.blake2b(
+        json.dumps({'name': name, **info}, sort_keys=True).encode(), digest_size=16
+    ).hexdigest()
+    for name, info in medications_data.items()
+}
+
 # Helper function to save uploaded images
 def save_base64_image(base64_string, filename_prefix="image"):
     try:
@@ -79,8 +123,8 @@ def save_base64_image(base64_string, filename_prefix="image"):
         if "base64," in base64_string:
             base64_string = base64_string.split("base64,")[1]
             
-        image_data = base64.b64decode(base64_string)
-        filename = f"{filename_prefix}_{uuid.uuid4().hex}.jpg"
+        image_data = _b64.b64decode(base64_string)
+        filename = f"{filename_prefix}_{secrets.token_hex(16)}.jpg"
         filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
         
         with open(filepath, "wb") as f:
@@ -91,6 +135,19 @@ def save_base64_image(base64_string, filename_prefix="image"):
         logger.error(f"Error saving base64 image: {str(e)}")
         return None
 
+def validated_base64_image(image_base64):
+    """Return the base64 payload of an upload without any data URI prefix, or None if it isn't valid base64."""
+    if not isinstance(image_base64, str):
+        return None
+    if "base64," in image_base64:
+        image_base64 = image_base64.split("base64,", 1)[1]
+    try:
+        if not _b64.b64decode(image_base64, validate=True):
+            return None
+    except (binascii.Error, ValueError):
+        return None
+    return image_base64
+
 # API Endpoints
 
 @app.route('/api/health', methods=['GET'])
@@ -108,23 +165,20 @@ def ocr_prescription():
         if 'image' not in request.json:
             return jsonify({'error': 'No image provided'}), 400
             
-        image_base64 = request.json['image']
-        image_path = save_base64_image(image_base64, "prescription")
+        # Reject malformed uploads here rather than sending them to Groq
+        image_base64 = validated_base64_image(request.json['image'])
+        if image_base64 is None:
+            return jsonify({'error': 'Invalid image data'}), 400
         
-        if not image_path:
-            return jsonify({'error': 'Failed to save image'}), 500
+        # Keep a copy of uploads only when debugging
+        if app.debug:
+            save_base64_image(image_base64, "prescription")
             
-        # Process prescription with Grok Vision
-        prescription_data = GroqVision.analyze_prescription(image_path)
-        
-        # Clean up the image file
-        try:
-            os.remove(image_path)
-        except:
-            pass
+        # Process prescription with Grok Vision, forwarding the base64 upload as-is
+        prescription_data = GroqVision.analyze_prescription(image_base64)
         
         # Generate a unique ID for the prescription
-        prescription_id = str(uuid.uuid4())[:8]
+        prescription_id = secrets.token_hex(4)
         
         # Return data to be stored in AsyncStorage by the client
         return jsonify({
@@ -146,14 +200,17 @@ def scan_medicine():
         if 'image' not in request.json:
             return jsonify({'error': 'No image provided'}), 400
             
-        image_base64 = request.json['image']
-        image_path = save_base64_image(image_base64, "medicine")
+        # Reject malformed uploads here rather than sending them to Groq
+        image_base64 = validated_base64_image(request.json['image'])
+        if image_base64 is None:
+            return jsonify({'error': 'Invalid image data'}), 400
         
-        if not image_path:
-            return jsonify({'error': 'Failed to save image'}), 500
+        # Keep a copy of uploads only when debugging
+        if app.debug:
+            save_base64_image(image_base64, "medicine")
             
-        # Identify the medication in the image using Grok Vision
-        medication_info = GroqVision.identify_medication(image_path)
+        # Identify the medication in the image using Grok Vision, forwarding the base64 upload as-is
+        medication_info = GroqVision.identify_medication(image_base64)
         
         # Check for prescription match if prescriptionId is provided
         if 'prescriptionData' in request.json:
@@ -170,12 +227,6 @@ def scan_medicine():
         else:
             medication_info['matchesPrescription'] = True  # Default if no prescription provided
         
-        # Clean up the image file
-        try:
-            os.remove(image_path)
-        except:
-            pass
-        
         return jsonify({
             'success': True,
             'data': medication_info
@@ -394,32 +445,100 @@ def medication_info():
         if not medication_name:
             return jsonify({'error': 'No medication name provided'}), 400
         
-        # Check if medication exists in our in-memory data
-        med_info = medications_data.get(medication_name)
-        
-        if not med_info:
-            # Try case-insensitive search
-            for name, info in medications_data.items():
-                if name.lower() == medication_name.lower():
-                    med_info = info
-                    break
+        # Check if medication exists in our in-memory data (case-insensitive)
+        name, med_info = _MED_CI.get(medication_name.lower(), (None, None))
         
         if not med_info:
             return jsonify({'error': 'Medication not found'}), 404
-            
-        return jsonify({
-            'success': True,
-            'data': {
-                'name': medication_name,
-                **med_info
-            }
-        })
+        
+        # The info is static, so let clients and proxies revalidate with If-None-Match
+        etag = _MED_ETAGS[name.lower()]
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = jsonify({
+                'success': True,
+                'data': {
+                    'name': medication_name,
+                    **med_info
+                }
+            })
+        response.set_etag(etag)
+        response.cache_control.public = True
+        response.cache_control.max_age = 86400
+        return response
     except Exception as e:
         logger.exception("Error retrieving medication info")
         return jsonify({'error': str(e)}), 500
 
 # New Diet Endpoints
 
+# Static instructions for meal plan generation, sent as the system message so they
+# form an identical prompt prefix across requests
+_MEAL_PLAN_SYSTEM_PROMPT = """You are a knowledgeable nutrition expert specializing in prenatal diet. Your task is to create a personalized meal plan that is safe and nutritious for pregnant women, accounting for their specific week of pregnancy, food preferences, allergies, and health conditions. Provide detailed recipes with nutritional information.
+
+Your response MUST be a single valid JSON object with exactly this structure, with no extra text before or after the JSON:
+
+{
+  "breakfast": [
+    {
+      "name": "Recipe Name",
+      "ingredients": ["ingredient 1", "ingredient 2"],
+      "instructions": "Step by step instructions",
+      "calories": 320,
+      "protein": "15g",
+      "carbs": "40g",
+      "fat": "10g",
+      "nutrients": ["nutrient 1", "nutrient 2"],
+      "pregnancyBenefits": "Benefits description"
+    }
+  ],
+  "lunch": [
+    {
+      "name": "Recipe Name",
+      "ingredients": ["ingredient 1", "ingredient 2"],
+      "instructions": "Step by step instructions",
+      "calories": 380,
+      "protein": "22g",
+      "carbs": "45g",
+      "fat": "12g",
+      "nutrients": ["nutrient 1", "nutrient 2"],
+      "pregnancyBenefits": "Benefits description"
+    }
+  ],
+  "dinner": [
+    {
+      "name": "Recipe Name",
+      "ingredients": ["ingredient 1", "ingredient 2"],
+      "instructions": "Step by step instructions",
+      "calories": 450,
+      "protein": "30g",
+      "carbs": "50g",
+      "fat": "15g",
+      "nutrients": ["nutrient 1", "nutrient 2"],
+      "pregnancyBenefits": "Benefits description"
+    }
+  ],
+  "snacks": [
+    {
+      "name": "Recipe Name",
+      "ingredients": ["ingredient 1", "ingredient 2"],
+      "instructions": "Step by step instructions",
+      "calories": 150,
+      "protein": "5g",
+      "carbs": "20g",
+      "fat": "5g",
+      "nutrients": ["nutrient 1", "nutrient 2"],
+      "pregnancyBenefits": "Benefits description"
+    }
+  ]
+}
+
+Include only ONE item in each of the breakfast, lunch, and dinner arrays, and TWO items in the snacks array. Make sure all string values use double quotes, not single quotes, to ensure valid JSON.
+
+Make sure to include the "ingredients" as an array of strings, and make each meal nutritious and appropriate for pregnancy."""
+
+
 @app.route('/api/diet/meal-plan', methods=['POST'])
 def generate_meal_plan():
     """Generate personalized meal plan for pregnant women using Grok."""
@@ -453,86 +572,12 @@ def generate_meal_plan():
             Daily Protein Goal: {preferences.get('proteinGoal', '70')} grams
         """
 
-        # Provide exact JSON structure format in the prompt
-        json_example = """
-        {
-          "breakfast": [
-            {
-              "name": "Recipe Name",
-              "ingredients": ["ingredient 1", "ingredient 2"],
-              "instructions": "Step by step instructions",
-              "calories": 320,
-              "protein": "15g",
-              "carbs": "40g",
-              "fat": "10g",
-              "nutrients": ["nutrient 1", "nutrient 2"],
-              "pregnancyBenefits": "Benefits description"
-            }
-          ],
-          "lunch": [
-            {
-              "name": "Recipe Name",
-              "ingredients": ["ingredient 1", "ingredient 2"],
-              "instructions": "Step by step instructions",
-              "calories": 380,
-              "protein": "22g",
-              "carbs": "45g",
-              "fat": "12g",
-              "nutrients": ["nutrient 1", "nutrient 2"],
-              "pregnancyBenefits": "Benefits description"
-            }
-          ],
-          "dinner": [
-            {
-              "name": "Recipe Name",
-              "ingredients": ["ingredient 1", "ingredient 2"],
-              "instructions": "Step by step instructions",
-              "calories": 450,
-              "protein": "30g",
-              "carbs": "50g",
-              "fat": "15g",
-              "nutrients": ["nutrient 1", "nutrient 2"],
-              "pregnancyBenefits": "Benefits description"
-            }
-          ],
-          "snacks": [
-            {
-              "name": "Recipe Name",
-              "ingredients": ["ingredient 1", "ingredient 2"],
-              "instructions": "Step by step instructions",
-              "calories": 150,
-              "protein": "5g",
-              "carbs": "20g",
-              "fat": "5g",
-              "nutrients": ["nutrient 1", "nutrient 2"],
-              "pregnancyBenefits": "Benefits description"
-            }
-          ]
-        }
-        """
-
-        # Create the prompt for the LLM
+        # Only the per-user preferences vary; the instructions live in the system prompt
         messages = [
-            {
-                "role": "system",
-                "content": """You are a knowledgeable nutrition expert specializing in prenatal diet. Your task is to create a personalized meal plan that is safe and nutritious for pregnant women, accounting for their specific week of pregnancy, food preferences, allergies, and health conditions. Provide detailed recipes with nutritional information.
-                
-                Your response MUST be valid JSON following the exact structure of the example provided by the user, with no extra text before or after the JSON. Include only one meal for each category (breakfast, lunch, dinner, and two items in snacks)."""
-            },
+            {"role": "system", "content": _MEAL_PLAN_SYSTEM_PROMPT},
             {
                 "role": "user",
-                "content": f"""Please create a one-day meal plan based on these preferences:
-                
-                {user_prefs_text}
-                
-                Return your response as JSON with exactly this structure:
-                
-                {json_example}
-                
-                Follow this structure precisely and include only ONE item in each of the breakfast, lunch, and dinner arrays, and TWO items in the snacks array. Make sure all string values use double quotes, not single quotes, to ensure valid JSON.
-                
-                Make sure to include the "ingredients" as an array of strings, and make each meal nutritious and appropriate for pregnancy.
-                """
+                "content": f"Please create a one-day meal plan based on these preferences:\n{user_prefs_text}"
             }
         ]
 
@@ -541,28 +586,16 @@ def generate_meal_plan():
             messages=messages,
             model="llama-3.3-70b-versatile",
             temperature=0.7,
-            max_completion_tokens=1500
+            max_completion_tokens=1500,
+            response_format={"type": "json_object"}
         )
         
         # Get the response text
         llm_response = completion.choices[0].message.content
         
-        # Try to extract JSON from the response
+        # JSON mode guarantees the whole response is a single JSON object
         try:
-            # First try to find JSON between code blocks
-            json_match = re.search(r'```(?:json)?\s*([\s\S]*?)\s*```', llm_response)
-            if json_match:
-                json_str = json_match.group(1).strip()
-                meal_plan_data = json.loads(json_str)
-            else:
-                # If that fails, try to extract any JSON object
-                json_match = re.search(r'({[\s\S]*})', llm_response)
-                if json_match:
-                    json_str = json_match.group(1).strip()
-                    meal_plan_data = json.loads(json_str)
-                else:
-                    # If all else fails, just try to parse the whole response
-                    meal_plan_data = json.loads(llm_response.strip())
+            meal_plan_data = json.loads(llm_response)
             
             # Validate the structure has the expected keys
             expected_keys = ['breakfast', 'lunch', 'dinner', 'snacks']
@@ -758,13 +791,13 @@ Follow this structure precisely. Make sure all string values use double quotes,
         # Try to extract JSON from the response
         try:
             # First try to find JSON between code blocks
-            json_match = re.search(r'```(?:json)?\s*([\s\S]*?)\s*```', llm_response)
+            json_match = _JSON_CODE_BLOCK_RE.search(llm_response)
             if json_match:
                 json_str = json_match.group(1).strip()
                 tips_data = json.loads(json_str)
             else:
                 # If that fails, try to extract any JSON array
-                json_match = re.search(r'(\[[\s\S]*?\])', llm_response)
+                json_match = _JSON_ARRAY_RE.search(llm_response)
                 if json_match:
                     json_str = json_match.group(1).strip()
                     tips_data = json.loads(json_str)
@@ -851,15 +884,15 @@ def identify_food():
         if 'image' not in request.json:
             return jsonify({'error': 'No image provided'}), 400
             
-        image_base64 = request.json['image']
-        image_path = save_base64_image(image_base64, "food")
-        
-        if not image_path:
-            return jsonify({'error': 'Failed to save image'}), 500
+        # Groq takes the image as base64 anyway, so forward the upload without saving it,
+        # after rejecting anything that isn't valid base64
+        image_base64 = validated_base64_image(request.json['image'])
+        if image_base64 is None:
+            return jsonify({'error': 'Invalid image data'}), 400
         
         # Use GroqVision class to identify the food
         try:
-            food_data = identify_food_with_vision(image_path)
+            food_data = identify_food_with_vision(image_base64)
         except Exception as e:
             logger.error(f"Error with vision API: {str(e)}")
             # Fallback response
@@ -870,12 +903,6 @@ def identify_food():
                 "nutritionalHighlights": [],
                 "pregnancyBenefits": ""
             }
-            
-        # Clean up the image file
-        try:
-            os.remove(image_path)
-        except:
-            pass
         
         return jsonify({
             'success': True,
@@ -885,21 +912,17 @@ def identify_food():
         logger.exception("Error identifying food item")
         return jsonify({'error': str(e)}), 500
 
-def identify_food_with_vision(image_path: str) -> dict:
+def identify_food_with_vision(base64_image: str) -> dict:
     """
     Identify food from an image using Groq Vision
     
     Args:
-        image_path: Path to the food image
+        base64_image: Base64-encoded JPEG image (without a data URI prefix)
         
     Returns:
         Dict containing identified food information
     """
     try:
-        # Convert image to base64
-        with open(image_path, "rb") as image_file:
-            base64_image = base64.b64encode(image_file.read()).decode('utf-8')
-        
         # Create a structured prompt for food identification
         combined_prompt = """
         You are a specialized food identification AI. Analyze the food image and extract ONLY the following data in JSON format:
@@ -923,12 +946,8 @@ def identify_food_with_vision(image_path: str) -> dict:
         """
         
         # Call Groq Vision API
-        response = requests.post(
+        response = groq_http.post(
             "https://api.groq.com/openai/v1/chat/completions",
-            headers={
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {os.getenv('GROQ_API_KEY', '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')}"
-            },
             json={
                 "model": "llama-3.2-11b-vision-preview",  # Current supported Groq vision model
                 "messages": [
@@ -961,13 +980,8 @@ def identify_food_with_vision(image_path: str) -> dict:
                 # If not, try to extract JSON from the text (in case there's extra text)
                 try:
                     # Look for JSON pattern
-                    import re
-                    json_pattern = r'({[\s\S]*})'
-                    match = re.search(json_pattern, content_text)
-                    if match:
-                        json_str = match.group(1)
-                        content = json.loads(json_str)
-                    else:
+                    content = extract_json_object(content_text)
+                    if content is None:
                         # Fallback to default structure
                         content = {
                             "name": "Apple",
@@ -1288,7 +1302,7 @@ Please suggest 3 recipes that can be made primarily with these ingredients. Foll
             
 #         # Decode base64 image
 #         try:
-#             image_data = base64.b64decode(image_base64)
+#             image_data = _b64.b64decode(image_base64)
 #             print(f"Successfully decoded base64 image, size: {len(image_data)} bytes")
 #         except Exception as e:
 #             print(f"Failed to decode base64: {e}")
@@ -1355,7 +1369,7 @@ Please suggest 3 recipes that can be made primarily with these ingredients. Foll
 #             image_base64 = image_base64.split(',')[1]
         
 #         try:
-#             image_data = base64.b64decode(image_base64)
+#             image_data = _b64.b64decode(image_base64)
 #         except Exception as e:
 #             print(f"Base64 decoding error: {e}")
 #             return jsonify({'error': 'Invalid image data'}), 400
@@ -1440,7 +1454,7 @@ def estimate_yoga_pose():
             
         # Decode base64 image
         try:
-            image_data = base64.b64decode(image_base64)
+            image_data = _b64.b64decode(image_base64)
             logger.info(f"Successfully decoded base64 image, size: {len(image_data)} bytes")
         except Exception as e:
             logger.error(f"Failed to decode base64: {e}")
@@ -1488,6 +1502,41 @@ def estimate_yoga_pose():
             }
         })
 
+# Upper bound on frames per /api/yoga/estimate_batch request
+_MAX_BATCH_FRAMES = 32
+
+@app.route('/api/yoga/estimate_batch', methods=['POST'])
+def estimate_yoga_pose_batch():
+    """Estimate yoga pose accuracy for a batch of camera frames in one request."""
+    try:
+        frames = request.json.get('frames')
+        if not frames or not isinstance(frames, list):
+            return jsonify({'error': 'No frames provided'}), 400
+        if len(frames) > _MAX_BATCH_FRAMES:
+            return jsonify({'error': f'Too many frames (max {_MAX_BATCH_FRAMES})'}), 400
+        if not all(isinstance(frame, str) for frame in frames):
+            return jsonify({'error': 'Frames must be base64 image strings'}), 400
+        
+        pose_id = request.json.get('pose_id', request.json.get('poseId', '1-1'))
+        logger.info(f"Received batch pose estimation request for poseId: {pose_id}, frames: {len(frames)}")
+        
+        results = advanced_yoga_pose_estimator.estimate_pose_batch(frames, pose_id)
+        
+        return jsonify({
+            'success': True,
+            'data': {
+                'detected': results['detected'],
+                'accuracies': results['accuracies'],
+                'keypoints': results['keypoints'],
+                'referenceKeypoints': results['reference_keypoints'],
+                'processingTime': results['processing_time'],
+                'timestamp': time.time()
+            }
+        })
+    except Exception as e:
+        logger.error(f"Error in batch pose estimation endpoint: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/yoga/posture-feedback', methods=['POST'])
 def get_yoga_posture_feedback():
     """Get feedback for yoga posture improvement."""
@@ -1496,6 +1545,8 @@ def get_yoga_posture_feedback():
             return jsonify({'error': 'No image provided'}), 400
             
         image_base64 = request.json['image']
+        if not isinstance(image_base64, str):
+            return jsonify({'error': 'Image must be a base64 string'}), 400
         pose_id = request.json.get('poseId', '1-1')  # Default to mountain pose
         is_final = request.json.get('isFinal', False)
         
@@ -1507,7 +1558,7 @@ def get_yoga_posture_feedback():
             image_base64 = image_base64.split(',')[1]
         
         try:
-            image_data = base64.b64decode(image_base64)
+            image_data = _b64.b64decode(image_base64)
         except Exception as e:
             logger.error(f"Base64 decoding error: {e}")
             return jsonify({'error': 'Invalid image data'}), 400
@@ -1567,6 +1618,6 @@ def get_reference_pose(pose_id):
 
 
 if __name__ == '__main__':
-    # Run the Flask app
+    # Run the Flask development server; production runs `gunicorn -c gunicorn_conf.py app:app`
     port = int(os.environ.get('PORT', 5001))
     app.run(debug=True, host='0.0.0.0', port=port)
\ No newline at end of file
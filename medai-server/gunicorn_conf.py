@@ -0,0 +1,24 @@
+# gunicorn_conf.py
+# Production server settings: gunicorn -c gunicorn_conf.py app:app
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5001)}"
+
+# Each worker process loads its own pose models, so keep the count modest
+workers = int(os.environ.get('WEB_CONCURRENCY', min(os.cpu_count() or 1, 4)))
+
+# Threaded workers: a request waiting on Groq releases the GIL and its thread
+# instead of holding up the worker. gevent is avoided on purpose - monkey
+# patching would turn the estimators' inference/preprocess threads into
+# greenlets that TensorFlow and MediaPipe block.
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 16))
+
+# Model loading and the first inference warm-up can take a while
+timeout = 120
+graceful_timeout = 30
+keepalive = 5
+
+# Worker heartbeat files on tmpfs; a disk-backed /tmp can stall heartbeats under I/O load
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
@@ -0,0 +1,50 @@
+# json_provider.py
+from flask.json.provider import DefaultJSONProvider
+
+# orjson is optional - JSON requests and responses fall back to the stdlib without it
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+class OrjsonProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider backed by orjson, used by jsonify() and request.json.
+
+    Output matches the default provider (keys sorted per sort_keys) except that:
+    - numpy arrays and scalars are serialized instead of raising TypeError
+    - NaN and +/-Infinity become null, where the stdlib writes the non-standard
+      NaN/Infinity tokens
+    - non-ASCII text is written as UTF-8 rather than \\u escapes
+    - integers beyond 64 bits in request bodies are parsed as floats
+    Objects orjson can't encode, such as integers beyond 64 bits, and calls
+    passing json.dumps/json.loads keyword arguments go through the default provider.
+    """
+
+    def _dumps_bytes(self, obj, indent=False):
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        try:
+            return orjson.dumps(obj, default=self.default, option=option)
+        except orjson.JSONEncodeError:
+            return super().dumps(obj, **({'indent': 2} if indent else {})).encode()
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return self._dumps_bytes(obj).decode()
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # Hand orjson's bytes straight to the response instead of round-tripping through str;
+        # pretty-printed like the default provider in debug mode unless compact is set
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = self.compact is False or (self.compact is None and self._app.debug)
+        return self._app.response_class(self._dumps_bytes(obj, indent), mimetype=self.mimetype)
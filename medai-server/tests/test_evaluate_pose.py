@@ -0,0 +1,69 @@
+import copy
+
+import pytest
+
+np = pytest.importorskip("numpy")
+advanced = pytest.importorskip("ai.AdvancedYogaPoseEstimator")
+
+POSE_IDS = sorted(advanced.POSE_ANGLE_DEFINITIONS)
+TRIMESTERS = ['first', 'second', 'third']
+
+
+@pytest.fixture(scope="module")
+def estimator():
+    # Scoring needs no models, so skip __init__ (which loads MoveNet)
+    return advanced.YogaPoseEstimator.__new__(advanced.YogaPoseEstimator)
+
+
+def _batch_score(estimator, detected, reference, pose_id, trimester):
+    keypoints = estimator._keypoints_to_array(detected)[None]
+    return float(estimator.evaluate_pose_batch(
+        keypoints, estimator._keypoints_to_array(reference), pose_id, trimester
+    )[0])
+
+
+def _with_position(keypoints, part, source):
+    """Copy of keypoints with part moved onto the position of source."""
+    keypoints = copy.deepcopy(keypoints)
+    by_part = {kp['part']: kp for kp in keypoints}
+    by_part[part]['position'] = dict(by_part[source]['position'])
+    return keypoints
+
+
+@pytest.mark.parametrize("trimester", TRIMESTERS)
+@pytest.mark.parametrize("pose_id", POSE_IDS)
+def test_batch_matches_angle_path(estimator, pose_id, trimester):
+    reference = estimator._get_reference_keypoints_for_pose_id(pose_id)
+    for detected_id in POSE_IDS:
+        detected = estimator._get_reference_keypoints_for_pose_id(detected_id)
+        expected = estimator._evaluate_pose_by_angles(detected, reference, pose_id, trimester)
+        assert _batch_score(estimator, detected, reference, pose_id, trimester) == pytest.approx(expected, abs=1e-3)
+
+
+@pytest.mark.parametrize("trimester", TRIMESTERS)
+def test_batch_matches_position_path_for_unknown_pose(estimator, trimester):
+    reference = estimator._get_reference_keypoints_for_pose_id('1-1')
+    for detected_id in POSE_IDS:
+        detected = estimator._get_reference_keypoints_for_pose_id(detected_id)
+        expected = estimator._evaluate_pose_by_angles(detected, reference, 'unknown', trimester)
+        assert _batch_score(estimator, detected, reference, 'unknown', trimester) == pytest.approx(expected, abs=1e-3)
+
+
+def test_zero_length_limb_scores_zero_in_both_paths(estimator):
+    reference = estimator._get_reference_keypoints_for_pose_id('1-1')
+    # Wrist on top of the elbow: the left arm angle is undefined
+    detected = _with_position(reference, 'left_wrist', 'left_elbow')
+
+    expected = estimator._evaluate_pose_by_angles(detected, reference, '1-1', 'second')
+    assert _batch_score(estimator, detected, reference, '1-1', 'second') == pytest.approx(expected, abs=1e-3)
+    # The degenerate angle contributes nothing, so the score drops by its weight share
+    intact = estimator._evaluate_pose_by_angles(reference, reference, '1-1', 'second')
+    assert expected < intact
+
+
+def test_evaluate_pose_uses_batch_kernel_for_complete_poses(estimator):
+    reference = estimator._get_reference_keypoints_for_pose_id('2-1')
+    detected = estimator._get_reference_keypoints_for_pose_id('2-3')
+    assert estimator.evaluate_pose(detected, reference, '2-1', 'third') == pytest.approx(
+        _batch_score(estimator, detected, reference, '2-1', 'third')
+    )
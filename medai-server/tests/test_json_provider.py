@@ -0,0 +1,54 @@
+import json
+
+import pytest
+
+flask = pytest.importorskip("flask")
+np = pytest.importorskip("numpy")
+pytest.importorskip("orjson")
+
+from json_provider import OrjsonProvider
+
+
+@pytest.fixture
+def app():
+    app = flask.Flask(__name__)
+    app.json = OrjsonProvider(app)
+    return app
+
+
+def test_jsonify_numpy_payload(app):
+    with app.app_context():
+        response = flask.jsonify({
+            'accuracies': np.array([0.5, 1.0], dtype=np.float32),
+            'count': np.int64(2),
+            'detected': np.array([True, False])
+        })
+    assert response.get_json() == {'accuracies': [0.5, 1.0], 'count': 2, 'detected': [True, False]}
+
+
+def test_jsonify_nan_becomes_null(app):
+    with app.app_context():
+        response = flask.jsonify({'accuracy': float('nan'), 'scores': np.array([np.nan, 1.0])})
+    assert response.get_json() == {'accuracy': None, 'scores': [None, 1.0]}
+
+
+def test_keys_sorted_like_default_provider(app):
+    with app.app_context():
+        body = flask.jsonify({'b': 1, 'a': {'d': 2, 'c': 3}}).get_data(as_text=True)
+    assert body == '{"a":{"c":3,"d":2},"b":1}'
+
+
+def test_debug_responses_are_indented(app):
+    app.debug = True
+    with app.app_context():
+        body = flask.jsonify({'a': 1}).get_data(as_text=True)
+    assert body == '{\n  "a": 1\n}'
+
+
+def test_kwargs_fall_back_to_default_provider(app):
+    assert app.json.dumps({'a': 1}, indent=4) == json.dumps({'a': 1}, indent=4, sort_keys=True)
+    assert app.json.loads('{"a": 1.5}', parse_float=str) == {'a': '1.5'}
+
+
+def test_big_int_falls_back_to_default_provider(app):
+    assert json.loads(app.json.dumps({'n': 2 ** 70})) == {'n': 2 ** 70}